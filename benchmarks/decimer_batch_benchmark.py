@@ -0,0 +1,53 @@
+import argparse
+import os
+import sys
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pathlib import Path
+from utils.decimer import predict_batches
+
+BATCH_SIZES = [1, 2, 4, 8, 16, 32]
+
+def throughput(images, batch_size: int, repeats: int):
+    """
+    Predict every image with one batch size and keep the best of `repeats` runs.
+
+    Returns:
+        tuple: (images per second, predicted SMILES in order).
+    """
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        smiles = list(predict_batches(images, batch_size))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(images) / best, smiles
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure DECIMER prediction throughput on CPU as the batch size varies.")
+    parser.add_argument("folder", type=Path, help="Folder of segment PNG images, e.g. a 'segments' folder saved by chemical_structure_segmentation with SAVE_SEGMENTS=1.")
+    parser.add_argument("-b", "--batch_sizes", type=int, nargs="+", default=BATCH_SIZES, help=f"Batch sizes to compare. Default = {' '.join(map(str, BATCH_SIZES))}")
+    parser.add_argument("-n", "--images", type=int, default=64, help="Images predicted per run. Default = 64")
+    parser.add_argument("-r", "--repeats", type=int, default=2, help="Runs per batch size, the best one is reported. Default = 2")
+    args = parser.parse_args()
+
+    images = sorted(str(path) for path in args.folder.glob('*.png'))[:args.images]
+    if not images:
+        parser.error(f"No PNG images in {args.folder}.")
+
+    # Load TensorFlow and the models before timing anything
+    start = time.perf_counter()
+    list(predict_batches(images[:1], 1))
+    print(f"Model loading and first prediction: {time.perf_counter() - start:.1f} s, {len(images)} images per run")
+
+    reference = None
+    print(f"{'batch size':>10}{'images/s':>12}{'speedup':>10}  same output")
+    for batch_size in args.batch_sizes:
+        rate, smiles = throughput(images, batch_size, args.repeats)
+        if reference is None:
+            reference = (rate, smiles)
+        print(f"{batch_size:>10}{rate:>12.2f}{rate / reference[0]:>10.2f}  {'yes' if smiles == reference[1] else 'NO'}")
+
+if __name__ == "__main__":
+    main()
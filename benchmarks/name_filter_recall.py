@@ -0,0 +1,75 @@
+import argparse
+import os
+import sys
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pathlib import Path
+from benchmarks.preprocessor_benchmark import PATENTS_FOLDER, load_text
+from utils.chemdata import molecule_names
+from utils.name_filter import MIN_NAME_SCORE, is_name_candidate
+from utils.preprocessor import iter_preprocessed_lines
+from utils.puller import iter_example_paragraphs
+
+def recall_report(text, min_score: int):
+    """
+    Parse every example paragraph of a text with ChemDataExtractor, as extract_molecules_from_text
+    does without the prefilter, and check which molecules the prefilter would have kept.
+
+    Args:
+        text (str): Raw text of a patent.
+        min_score (int): Prefilter threshold.
+
+    Returns:
+        dict: Paragraph and molecule counts, the molecules the prefilter drops and the parsing times.
+    """
+    report = {'paragraphs': 0, 'candidates': 0, 'molecules': 0, 'kept': 0, 'dropped': [], 'all_time': 0.0, 'candidate_time': 0.0}
+    for example, paragraph in iter_example_paragraphs(iter_preprocessed_lines(text.split('\n'))):
+        candidate = is_name_candidate(paragraph, min_score)
+        start = time.perf_counter()
+        names = molecule_names(paragraph)
+        elapsed = time.perf_counter() - start
+
+        report['paragraphs'] += 1
+        report['molecules'] += len(names)
+        report['all_time'] += elapsed
+        if candidate:
+            report['candidates'] += 1
+            report['kept'] += len(names)
+            report['candidate_time'] += elapsed
+        else:
+            report['dropped'].extend(f"Example {example}: {name}" for name in names)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the recall of the systematic-name prefilter against the unfiltered ChemDataExtractor output.")
+    parser.add_argument("files", nargs="*", type=Path, help="PDF or text files to check. Default = the PDFs in test/Patents.")
+    parser.add_argument("-s", "--min-score", type=int, default=MIN_NAME_SCORE, help=f"Prefilter threshold. Default = {MIN_NAME_SCORE}")
+    parser.add_argument("-n", "--show", type=int, default=20, help="Dropped molecules listed per file. Default = 20")
+    args = parser.parse_args()
+
+    files = args.files if args.files else sorted(PATENTS_FOLDER.glob('*.pdf'))
+    totals = {'paragraphs': 0, 'candidates': 0, 'molecules': 0, 'kept': 0, 'all_time': 0.0, 'candidate_time': 0.0}
+
+    print(f"{'file':<24}{'paragraphs':>12}{'parsed':>8}{'skipped':>9}{'molecules':>11}{'recall':>8}{'CDE time saved':>16}")
+    for path in files:
+        report = recall_report(load_text(path), args.min_score)
+        for key in totals:
+            totals[key] += report[key]
+        recall = report['kept'] / report['molecules'] if report['molecules'] else 1.0
+        skipped = 1 - report['candidates'] / report['paragraphs'] if report['paragraphs'] else 0.0
+        saved = 1 - report['candidate_time'] / report['all_time'] if report['all_time'] else 0.0
+        print(f"{path.name:<24}{report['paragraphs']:>12}{report['candidates']:>8}{skipped:>9.1%}{report['molecules']:>11}{recall:>8.1%}{saved:>16.1%}")
+        for molecule in report['dropped'][:args.show]:
+            print(f"    dropped {molecule}")
+        if len(report['dropped']) > args.show:
+            print(f"    ... and {len(report['dropped']) - args.show} more")
+
+    if totals['paragraphs']:
+        recall = totals['kept'] / totals['molecules'] if totals['molecules'] else 1.0
+        skipped = 1 - totals['candidates'] / totals['paragraphs']
+        saved = 1 - totals['candidate_time'] / totals['all_time'] if totals['all_time'] else 0.0
+        print(f"{'total':<24}{totals['paragraphs']:>12}{totals['candidates']:>8}{skipped:>9.1%}{totals['molecules']:>11}{recall:>8.1%}{saved:>16.1%}")
+
+if __name__ == "__main__":
+    main()
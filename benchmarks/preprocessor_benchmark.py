@@ -0,0 +1,96 @@
+import argparse
+import os
+import re
+import sys
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pathlib import Path
+from utils.preprocessor import apply_preprocess_rules, iter_preprocessed_lines
+
+PATENTS_FOLDER = Path(__file__).resolve().parent.parent / 'test' / 'Patents'
+
+def legacy_preprocess_text(text):
+    """
+    preprocess_text as it was before the compiled rule engine, kept as the reference the
+    engine output is compared against.
+    """
+    text = re.sub(r'(?<=\n)(\d+)\s+(?=[^-,a-zA-Z])', r'\n', text)
+    text = re.sub(r'(?<=\n)-\s*(\d+)\s*-(?=\n)', r'\n', text)
+    text = re.sub(r'(?<=\n)-\s*(\d+)\s*-(?=\s*\n)', r'\n', text)
+    text = re.sub(r'\s+$', '', text, flags=re.MULTILINE)
+    text = re.sub(r'(\S)-\n\s*', r'\1-', text)
+    text = re.sub(r'\n-([\\s\S]*)', r'\1-', text)
+    l_replacements = ['lH', '(l(', ')l)', '-l-', '-l)', '(l-', 'yl)', 'l,', ',l',]
+    v_replacements = ['cvc', 'nvl', 'xvc', 'pvr', 'zvl', 'hvl', ]
+    for rep_l in l_replacements:
+        text = text.replace(rep_l, rep_l.replace('l', '1'))
+    for rep_v in v_replacements:
+        text = text.replace(rep_v, rep_v.replace('v', 'y'))
+    text = re.sub(r'\(\s+', '(', text)
+    text = re.sub(r'\s+\)', ')', text)
+    text = re.sub(r'\[\s+', '[', text)
+    text = re.sub(r'\s+\]', ']', text)
+    text = re.sub(r'\{\s+', '{', text)
+    text = re.sub(r'\s+\}', '}', text)
+    text = re.sub(r'\s*-\s*', '-', text)
+    text = re.sub(r'\-l\s+', '-1', text)
+    text = re.sub(r'(\d)\s*,\s*(\d)', r'\1,\2', text)
+    text = text.replace('y1', 'yl')
+    text = text.replace('-IH', '-1H')
+    text = re.sub(r'\bl-', '1-', text)
+    text = re.sub(r':', '', text)
+    text = re.sub(r'(Preparation of):', r'Preparation of ', text)
+    text = re.sub(r'(Preparation ofN)', r'Preparation of N', text)
+    text = re.sub(r'^\s*\n', '', text, flags=re.MULTILINE)
+    valid_iupac_pattern = re.compile(r'^[a-zA-Z0-9,\-\(\)\[\]\{\}\.\s]+$')
+    text = '\n'.join(line for line in text.split('\n') if valid_iupac_pattern.match(line.strip()))
+    text = re.sub(r'^.{1,4}$[\s\S]*?\n', '', text, flags=re.MULTILINE)
+    return text
+
+def load_text(path: Path):
+    """
+    Load the text of a sample: .txt files are read as is, PDF files through the PyMuPDF text layer.
+    """
+    if path.suffix.lower() == '.pdf':
+        from utils.document import PatentDocument
+        with PatentDocument(path) as document:
+            return "".join(document.get_text(page_index) for page_index in range(document.page_count))
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def best_time(function, text, repeats):
+    """Best wall time of `repeats` calls, in seconds."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(text)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the compiled preprocess_text engine with the previous implementation.")
+    parser.add_argument("files", nargs="*", type=Path, help="PDF or text files to preprocess. Default = the PDFs in test/Patents.")
+    parser.add_argument("-r", "--repeats", type=int, default=5, help="Runs per file, the best one is reported. Default = 5")
+    args = parser.parse_args()
+
+    files = args.files if args.files else sorted(PATENTS_FOLDER.glob('*.pdf'))
+    total_legacy = total_engine = 0.0
+
+    print(f"{'file':<24}{'chars':>10}{'legacy (ms)':>14}{'engine (ms)':>14}{'speedup':>10}  identical")
+    for path in files:
+        text = load_text(path)
+        expected = legacy_preprocess_text(text)
+        # Both the whole-text and the streaming modes must give the previous output
+        identical = expected == apply_preprocess_rules(text) == '\n'.join(iter_preprocessed_lines(text.split('\n')))
+        legacy = best_time(legacy_preprocess_text, text, args.repeats)
+        engine = best_time(apply_preprocess_rules, text, args.repeats)
+        total_legacy += legacy
+        total_engine += engine
+        print(f"{path.name:<24}{len(text):>10}{legacy * 1000:>14.1f}{engine * 1000:>14.1f}{legacy / engine:>9.2f}x  {identical}")
+
+    if total_engine:
+        print(f"{'total':<34}{total_legacy * 1000:>14.1f}{total_engine * 1000:>14.1f}{total_legacy / total_engine:>9.2f}x")
+
+if __name__ == "__main__":
+    main()
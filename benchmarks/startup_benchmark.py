@@ -0,0 +1,65 @@
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+ENTRY_POINTS = ['pdf2activity', 'pdf2iupac', 'pdfimg2smiles', 'launcher']
+# Backends that should only be loaded by the stages that use them
+HEAVY_MODULES = ['tensorflow', 'DECIMER', 'decimer_segmentation', 'chemdataextractor', 'rdkit', 'pytesseract', 'pdf2image', 'fitz', 'pdfplumber', 'PyPDF2', 'openpyxl', 'pandas']
+
+# Runs in a fresh interpreter: import one entry point and report time, peak RSS and loaded backends
+IMPORT_PROBE = """
+import importlib, json, resource, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+elapsed = time.perf_counter() - start
+heavy = json.loads(sys.argv[2])
+print(json.dumps({
+    'seconds': elapsed,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'loaded': [name for name in heavy if name in sys.modules],
+}))
+"""
+
+def probe_import(module: str):
+    """
+    Import an entry point in a fresh interpreter.
+
+    Returns:
+        dict: Import time, peak RSS and loaded heavy modules, or the error message if the import failed.
+    """
+    result = subprocess.run([sys.executable, '-c', IMPORT_PROBE, module, json.dumps(HEAVY_MODULES)], cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {'error': result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"exit code {result.returncode}"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def time_help(module: str):
+    """Wall time of `python <entry point>.py --help`, in seconds, or None if it failed."""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, str(ROOT / f'{module}.py'), '--help'], cwd=ROOT, capture_output=True)
+    return time.perf_counter() - start if result.returncode == 0 else None
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the startup time and import memory of each entry point.")
+    parser.add_argument("entry_points", nargs="*", default=ENTRY_POINTS, help=f"Entry points to measure. Default = {' '.join(ENTRY_POINTS)}")
+    parser.add_argument("-r", "--repeats", type=int, default=3, help="Runs per entry point, the best one is reported. Default = 3")
+    args = parser.parse_args()
+
+    print(f"{'entry point':<16}{'import (s)':>12}{'--help (s)':>12}{'max RSS (MB)':>14}  loaded backends")
+    for module in args.entry_points:
+        probes = [probe_import(module) for _ in range(args.repeats)]
+        failed = [probe for probe in probes if 'error' in probe]
+        if failed:
+            print(f"{module:<16}  import failed: {failed[0]['error']}")
+            continue
+        best = min(probes, key=lambda probe: probe['seconds'])
+        help_times = [help_time for help_time in (time_help(module) for _ in range(args.repeats)) if help_time is not None]
+        help_time = f"{min(help_times):>12.2f}" if help_times else f"{'failed':>12}"
+        print(f"{module:<16}{best['seconds']:>12.2f}{help_time}{best['max_rss_mb']:>14.1f}  {', '.join(best['loaded']) or '-'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pathlib import Path
+
+def stage_runner(stage: str, batch_size: int):
+    """
+    Function running one TensorFlow stage over a list of images in this process: DECIMER
+    prediction of segment images, or decimer_segmentation of page images.
+    """
+    if stage == 'prediction':
+        from utils.decimer import predict_batches
+        return lambda images: list(predict_batches(images, batch_size))
+
+    from PIL import Image
+    from utils.pdf_to_img import page_segments
+
+    def segment(images):
+        for image in images:
+            with Image.open(image) as page:
+                page_segments(page.convert('RGB'))
+    return segment
+
+def run_share(stage: str, images, budget: int, workers: int, batch_size: int, barrier, results):
+    """
+    Worker: take a `1 / workers` share of the TensorFlow thread budget, load the models of the
+    stage, then run the stage on `images` once every worker is ready, and report the elapsed time.
+    """
+    os.environ["TF_THREAD_BUDGET"] = str(budget)
+    os.environ["TF_WORKERS"] = str(workers)
+    os.environ["INFERENCE_SERVER"] = "0"  # Measure this process, not a running server
+
+    from utils.tf_config import thread_counts
+
+    run = stage_runner(stage, batch_size)
+    run(images[:1])  # Load the models before the clock starts
+    barrier.wait()
+    start = time.perf_counter()
+    run(images)
+    results.put((time.perf_counter() - start, thread_counts()))
+
+def run_split(stage: str, images, budget: int, workers: int, batch_size: int):
+    """
+    Run a stage on `images` with `workers` processes sharing `budget` cores.
+
+    Returns:
+        tuple: (images per second, (intra-op, inter-op) threads of each process).
+    """
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    shares = [images[index::workers] for index in range(workers)]
+    processes = [context.Process(target=run_share, args=(stage, share, budget, workers, batch_size, barrier, results)) for share in shares]
+    for process in processes:
+        process.start()
+    timings = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return len(images) / max(elapsed for elapsed, _ in timings), timings[0][1]
+
+def benchmark_stage(stage: str, images, cores: int, batch_size: int):
+    """Print the images per second of every processes x threads split of `cores` for a stage, and the best split."""
+    splits = [workers for workers in range(1, cores + 1) if cores % workers == 0 and workers <= len(images)]
+    best = None
+    print(f"Stage {stage}, {len(images)} images")
+    print(f"{'processes':>10}{'intra-op':>10}{'inter-op':>10}{'images/s':>12}")
+    for workers in splits:
+        rate, (intra, inter) = run_split(stage, images, cores, workers, batch_size)
+        print(f"{workers:>10}{intra:>10}{inter:>10}{rate:>12.2f}")
+        if best is None or rate > best[0]:
+            best = (rate, workers, intra)
+    print(f"Best split for {stage}: {best[1]} processes x {best[2]} TensorFlow threads ({best[0]:.2f} images/s).")
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the best split of a CPU budget between processes and TensorFlow threads, for DECIMER prediction and structure segmentation.")
+    parser.add_argument("folder", type=Path, nargs="?", help="Folder of segment PNG images, for the prediction stage.")
+    parser.add_argument("-p", "--pages", type=Path, help="Folder of rendered page PNG images, for the segmentation stage.")
+    parser.add_argument("-c", "--cores", type=int, default=os.cpu_count(), help=f"Core budget to split. Default = {os.cpu_count()}")
+    parser.add_argument("-n", "--images", type=int, default=64, help="Segment images predicted per split. Default = 64")
+    parser.add_argument("-m", "--page_images", type=int, default=16, help="Page images segmented per split. Default = 16")
+    parser.add_argument("-b", "--batch_size", type=int, default=8, help="DECIMER batch size. Default = 8")
+    args = parser.parse_args()
+
+    if args.folder is None and args.pages is None:
+        parser.error("Give a folder of segment images, a folder of page images (-p), or both.")
+
+    for stage, folder, count in (('prediction', args.folder, args.images), ('segmentation', args.pages, args.page_images)):
+        if folder is None:
+            continue
+        images = sorted(str(path) for path in folder.glob('*.png'))[:count]
+        if not images:
+            parser.error(f"No PNG images in {folder}.")
+        benchmark_stage(stage, images, args.cores, args.batch_size)
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,15 @@
+import os
 import subprocess
 import threading
 from queue import Queue
 
-from utils import out_format
 from pdf2iupac import pdf2iupac_conversion
-from utils.pdfimg2smiles import pdfimg2smiles_conversion
-from utils.pdf2activity import pdf2activity_conversion
-from utils.structure_activity import structure_activity_association
-from utils.out_format import sdf_output_format
-from utils.out_format import smi_output_format
+from pdfimg2smiles import pdfimg2smiles_conversion
+from pdf2activity import pdf2activity_conversion
+from utils.document import PatentDocument
+from utils.pdf_to_img import segmentation_processes
+from utils.run_report import run_report
+from utils.tf_config import TF_DEVICES, share_thread_budget
 
 
 def run_script(script, args):
@@ -23,21 +24,43 @@ def run_script_in_thread(script, args, output_queue):
     output = run_script(script, args)
     output_queue.put(output)
 
-def process_file(file_path, start_num, end_num, output_format):
-    output_queue = Queue()
-    
-    threads = []
-    for script in [pdf2iupac_conversion, pdfimg2smiles_conversion, pdf2activity_conversion]:
-        thread = threading.Thread(target=run_script_in_thread, args=(script, [file_path, str(start_num), str(end_num)], output_queue))
-        thread.start()
-        threads.append(thread)
-    
-    for thread in threads:
-        thread.join()
+def run_stage(stage, args):
+    try:
+        return stage(*args)
+    except Exception as e:
+        print(f"Error running {stage.__name__}: {e}")
+        return None
 
-    outputs = [output_queue.get() for _ in range(3)]
+def run_stage_in_thread(stage, args, outputs, index):
+    outputs[index] = run_stage(stage, args)
+
+def process_file(file_path, start_num, end_num, output_format):
+    # Open the patent once and share the handle across the three pipelines
+    with PatentDocument(file_path) as document:
+        start_num = int(start_num)
+        end_num = int(end_num) if end_num is not None else document.page_count
+
+        stages = [
+            (pdf2iupac_conversion, (document, start_num, end_num, True)),
+            (pdfimg2smiles_conversion, (document, start_num, end_num)),
+            (pdf2activity_conversion, (document, start_num, end_num, True)),
+        ]
+        outputs = [None] * len(stages)
+
+        threads = []
+        for index, (stage, args) in enumerate(stages):
+            thread = threading.Thread(target=run_stage_in_thread, args=(stage, args, outputs, index))
+            thread.start()
+            threads.append(thread)
+
+        for thread in threads:
+            thread.join()
 
     if all(outputs):
+        # Association and output backends are only loaded once the three pipelines succeeded
+        from utils.structure_activity import structure_activity_association
+        from utils.out_format import sdf_output_format, smi_output_format
+
         output = run_script(structure_activity_association(), outputs)
         
         if output_format == 'smi':
@@ -64,7 +87,16 @@ def parse_range(range_str):
     except ValueError:
         raise argparse.ArgumentTypeError("Range must be in the format start:end")
 
-def main(file_path, range_str, output_format, text_file=None, threads=1):
+def tensorflow_processes():
+    """TensorFlow runtimes of a run: this process, which predicts SMILES, and the segmentation workers."""
+    return 1 + segmentation_processes()
+
+def main(file_path, range_str, output_format, text_file=None, threads=1, tf_threads=None, device=None):
+    # Split the TensorFlow cores across the processes running it, before any of them starts
+    if device:
+        os.environ["TF_DEVICE"] = device
+    share_thread_budget(tensorflow_processes(), tf_threads)
+
     if range_str is None:
         start_num = 1
         end_num = None
@@ -86,6 +118,9 @@ def main(file_path, range_str, output_format, text_file=None, threads=1):
 
     queue.join()
 
+    # Pages skipped by the watchdog of any pipeline, see utils/watchdog.py
+    run_report.write()
+
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="BREVE DESCRIZIONE DEL TOOL")
@@ -93,6 +128,8 @@ if __name__ == "__main__":
     parser.add_argument("-r", "--range", help="Range in the format start:end. Use '--all' to analyze the entire file.")
     parser.add_argument("-t", "--text_file", help="Text file with a list of file paths to process.")
     parser.add_argument("-n", "--threads", type=int, default=1, help="Number of threads to be used to parallelize the process. Default = 1")
+    parser.add_argument("--tf_threads", type=int, help="Cores shared by the TensorFlow stages of the run. Default = all cores")
+    parser.add_argument("-d", "--device", choices=TF_DEVICES, help="Device of the TensorFlow stages. Default = auto, a GPU when there is one")
     parser.add_argument("-o", "--output_format", choices=['default', 'smi', 'sdf'], default='default', help="Output format. Default is the default format from script4. 'smi' and 'sdf' trigger additional processing scripts.")
     
     args = parser.parse_args()
@@ -103,4 +140,4 @@ if __name__ == "__main__":
     if args.range == "all":
         args.range = None
 
-    main(args.file_path, args.range, args.output_format, args.text_file, args.threads)
+    main(args.file_path, args.range, args.output_format, args.text_file, args.threads, args.tf_threads, args.device)
@@ -1,71 +1,50 @@
 import argparse
 import os
 import pandas as pd
-import re
 import shutil
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from pathlib import Path
-from utils.converter import pdf_to_excel, excel_to_csv
+from utils.activity import natural_sort, normalize_molecule_ids
+from utils.converter import EXPORT_TABLES_XLSX, extract_tables, tables_to_excel
+from utils.document import shared_document
 from utils.folder_check import create_folder_in_working_directory
-from utils.puller import extract_activity_from_csv, extract_activity_from_pdf, save_activity_to_csv
+from utils.puller import extract_activity_from_pdf, extract_activity_from_tables, save_activity_to_csv
 from utils.pdf_splitter import pdf_extraction
+from utils.run_report import run_report
+from utils.triage import TABLE, TEXT, select_pages
 
-def ensure_example_prefix(molecule_id):
-    """
-    Ensure that each molecule_id contains the prefix 'Example' and remove any extra spaces.
-    Args:
-        molecule_id (str): The molecule ID to check and possibly modify.
-    Returns:
-        str: The modified molecule ID with 'Example' as a prefix and no extra spaces.
-    """
-    molecule_id = re.sub(r'\s+', ' ', molecule_id).strip()  # Remove extra spaces
-    if not molecule_id.startswith("Example"):
-        return f"Example {molecule_id}"
-    return molecule_id
-
-def sort_key(molecule_id):
-    """
-    Key function for sorting molecule_id strings.
-    Args:
-        molecule_id (str): The molecule ID string to convert to a sortable tuple.
-    Returns:
-        tuple: A tuple containing the numerical part and any alphabetical suffix for sorting.
-    """
-    match = re.match(r'Example (\d+)([A-Za-z]?)', molecule_id)
-    if match:
-        num_part = int(match.group(1))
-        suffix_part = match.group(2)
-        return (num_part, suffix_part)
-    else:
-        # Handle cases where molecule_id does not start with "Example"
-        return (0, molecule_id)  # Adjust default tuple as per your sorting needs
-
-def pdf2activity_conversion(pdfile_path: Path, start_page: int, last_page: int, together: bool = False):
+def pdf2activity_conversion(pdfile_path, start_page: int, last_page: int, together: bool = False):
     """
     Orchestrates the conversion process from PDF pages to activity data CSV.
 
     Args:
-        pdfile_path (Path): Path to the PDF file.
+        pdfile_path (PatentDocument or Path): Shared document handle or path to the PDF file.
         start_page (int): First page to extract (1-based index).
         last_page (int): Last page to extract (1-based index).
-        together (bool, optional): Flag to extract pages together into a single file. Defaults to False.
+        together (bool, optional): Flag to extract pages together into a single view. Defaults to False.
+
+    Returns:
+        Path: Path to the activity CSV file.
     """
-    patent_name = pdfile_path.stem  # Extract filename without extension as patent name
     pdf2activity_folder = Path(create_folder_in_working_directory('pdf_to_activity'))  # Create output folder
 
-    # Split PDF into pages or together based on 'together' flag
-    pdf_extraction(pdfile_path, start_page, last_page, pdf2activity_folder, together)
-    
-    pdfs_to_process = [pdf2activity_folder / f"{patent_name}_extracted.pdf"]
+    # Open the PDF once for every page view, and close it afterwards if it was opened here
+    with shared_document(pdfile_path) as document:
+        patent_name = document.stem  # Extract filename without extension as patent name
+
+        # Split PDF into in-memory page views, one per page or together based on 'together' flag
+        pages = pdf_extraction(document, start_page, last_page, together=together)
+        pdfs_to_process = [pages] if together else pages
 
-    # Extract activity data from each PDF and save as CSV
-    for pdf in pdfs_to_process:
-        activity_data = pdf_activity_extractor(pdf, pdf2activity_folder)
-        if activity_data is not None:
-            output_file = pdf2activity_folder / f"{patent_name}_{start_page}_{last_page}_activity.csv"  # Change extension to CSV
-            save_activity_to_csv(activity_data, output_file)
+        # Extract activity data from each page view and save as CSV
+        activity_data = {}
+        for pdf in pdfs_to_process:
+            activity_data.update(pdf_activity_extractor(pdf, pdf2activity_folder))
+
+    output_file = pdf2activity_folder / f"{patent_name}_{start_page}_{last_page}_activity.csv"  # Change extension to CSV
+    save_activity_to_csv(activity_data, output_file)
 
     all_data = []
     for csv_file in pdf2activity_folder.glob(f"{patent_name}_{start_page}_{last_page}_activity.csv"):
@@ -74,35 +53,30 @@ def pdf2activity_conversion(pdfile_path: Path, start_page: int, last_page: int,
     
     if all_data:
         combined_df = pd.concat(all_data)  # Concatenate all dataframes
-        combined_df['molecule_id'] = combined_df['molecule_id'].apply(str).apply(ensure_example_prefix)  # Ensure 'Example' prefix and convert to string
-        
-        # Convert molecule_id to a sortable tuple using sort_key
-        combined_df['sort_key'] = combined_df['molecule_id'].apply(sort_key)
+        combined_df['molecule_id'] = normalize_molecule_ids(combined_df['molecule_id'])  # Ensure 'Example' prefix and convert to string
         
-        # Sort by sort_key
-        combined_df.sort_values(by=['sort_key'], inplace=True)
-        
-        # Drop the temporary sort_key column
-        combined_df.drop(columns=['sort_key'], inplace=True)
+        # Sort by example number, then by suffix letter, on whole columns
+        combined_df = natural_sort(combined_df, 'molecule_id')
         
         combined_df.to_csv(output_file, index=False, header=False)
     
-    # Clean up: remove individual CSV files and PDFs
+    # Clean up: remove intermediate CSV, Excel and text files, keeping requested Excel debug exports
     for file in pdf2activity_folder.glob(f"{patent_name}_extracted*.csv"):
         file.unlink()
     for file in pdf2activity_folder.glob(f"{patent_name}_*.xlsx"):
-        file.unlink()
-    for file in pdf2activity_folder.glob("*.pdf"):
-        file.unlink()
+        if not EXPORT_TABLES_XLSX:
+            file.unlink()
     for file in pdf2activity_folder.glob("*.txt"):
         file.unlink()
 
-def pdf_activity_extractor(pdf_file: Path, pdf2activity_folder: Path):
+    return output_file
+
+def pdf_activity_extractor(pdf_file, pdf2activity_folder: Path):
     """
     Extract activity from a PDF and save them in a CSV file.
 
     Args:
-        pdf_file (Path): Path to the input PDF file.
+        pdf_file (PageRange or Path): Page view or path to the input PDF file.
         pdf2activity_folder (Path): Path to the output folder for CSV files.
 
     Returns:
@@ -112,19 +86,19 @@ def pdf_activity_extractor(pdf_file: Path, pdf2activity_folder: Path):
         # Generate filenames based on the PDF file name
         base_name = pdf_file.stem
         excel_file = pdf2activity_folder / (base_name + '_tables.xlsx')
-        csv_file = pdf2activity_folder / (base_name + '_tables.csv')
 
-        # Extract tables from PDF and convert to CSV
-        tables_extracted = pdf_to_excel(pdf_file, excel_file)
+        # Extract tables from PDF in memory, reading only the pages triaged as tables
+        tables_extracted, tables = extract_tables(select_pages(pdf_file, TABLE))
+        if EXPORT_TABLES_XLSX:
+            tables_to_excel(tables, excel_file)
         
         if tables_extracted:
-            # Extract text from PDF and preprocess CSV and text files
-            excel_to_csv(excel_file, csv_file)
-            activity_data = extract_activity_from_csv(csv_file)
+            # Extract activity straight from the table rows
+            activity_data = extract_activity_from_tables(tables)
             
         else:        
-            # If no tables extracted, directly extract activity from pdf
-            activity_data = extract_activity_from_pdf(pdf_file)
+            # If no tables extracted, directly extract activity from the text pages
+            activity_data = extract_activity_from_pdf(select_pages(pdf_file, TEXT))
 
         # If no activity found, print a message and return
         if not activity_data:
@@ -151,6 +125,7 @@ def main():
         last_page=args.end_page,
         together=args.together
     )
+    run_report.write()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
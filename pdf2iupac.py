@@ -4,26 +4,44 @@ import os
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'  # Suppress TensorFlow warnings
 import re
 import sys
+import tempfile
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add parent directory to sys.path
 
 from pathlib import Path
 from utils.cleaner import csv_cleaning
+from utils.converter import EXPORT_TABLES_XLSX
 from utils.folder_check import create_folder_in_working_directory
 from utils.pdf_splitter import pdf_extraction
-from utils.iupac_extractor import pdf_molecules_extractor
+from utils.iupac_extractor import MOLECULE_STAGES, has_rows
 from utils.iupac_to_smiles import from_iupac_to_smiles_conversion
+from utils.run_report import run_report
+from utils.stages import Stage, run_stages
 
-def csv_filtering(csv_file):
+def temporary_csv(output_file):
+    """
+    Create an empty temporary file next to `output_file`, unique to the caller, so that
+    documents processed at the same time never write the same file before replacing their output.
+
+    Returns:
+        str: Path of the temporary file.
+    """
+    output_file = os.path.abspath(output_file)
+    with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(output_file), prefix=f"{Path(output_file).stem}.", suffix=".tmp.csv", delete=False) as f:
+        return f.name
+
+def csv_filtering(csv_file, output_file=None):
     """
     Filter lines in CSV file to keep only those containing "Example [number];".
     
     Args:
         csv_file (str): Path to the input CSV file.
+        output_file (str, optional): Path of the filtered CSV file. Defaults to filtering csv_file in place.
 
     Returns:
         str: Path to the filtered CSV file.
     """
-    temp_csv = "temp.csv"
+    output_file = output_file if output_file else csv_file
+    temp_csv = temporary_csv(output_file)
     print(f"Filtering CSV: {csv_file}")
 
     # Define the pattern to match lines containing "Example [number];"
@@ -35,10 +53,10 @@ def csv_filtering(csv_file):
             if pattern.search(line):
                 outfile.write(line)
 
-    # Replace the original file with the temporary file
-    os.replace(temp_csv, csv_file)
+    # Replace the original file, or create the output file, with the temporary file
+    os.replace(temp_csv, output_file)
     
-    return csv_file
+    return output_file
 
 def extract_key(row):
     """
@@ -53,17 +71,19 @@ def extract_key(row):
     match = re.match(r"Example (\d+);", row[0])
     return int(match.group(1)) if match else float('inf')  # Return a large number to sort unmatched rows last
 
-def csv_sorting(csv_file):
+def csv_sorting(csv_file, output_file=None):
     """
     Sorts rows in a CSV file based on the "Example [number];" format.
 
     Args:
         csv_file (str): Path to the input CSV file.
+        output_file (str, optional): Path of the sorted CSV file. Defaults to sorting csv_file in place.
 
     Returns:
         str: Path to the sorted CSV file.
     """
-    temp_csv = "temp.csv"
+    output_file = output_file if output_file else csv_file
+    temp_csv = temporary_csv(output_file)
     print(f"Sorting CSV: {csv_file}")
 
     # Read the CSV file
@@ -79,22 +99,24 @@ def csv_sorting(csv_file):
         writer = csv.writer(outfile)
         writer.writerows(sorted_rows)
 
-    # Replace the original file with the sorted file
-    os.replace(temp_csv, csv_file)
+    # Replace the original file, or create the output file, with the sorted file
+    os.replace(temp_csv, output_file)
 
-    return csv_file
+    return output_file
 
-def adjust_csv(csv_file):
+def adjust_csv(csv_file, output_file=None):
     """
     Adjusts CSV format by changing delimiter and adding header.
 
     Args:
         csv_file (str): Path to the input CSV file.
+        output_file (str, optional): Path of the adjusted CSV file. Defaults to adjusting csv_file in place.
 
     Returns:
         str: Path to the adjusted CSV file.
     """
-    temp_csv = "temp.csv"
+    output_file = output_file if output_file else csv_file
+    temp_csv = temporary_csv(output_file)
     print(f"Adjusting CSV: {csv_file}")
 
     with open(csv_file, 'r') as infile, open(temp_csv, 'w', newline='') as outfile:
@@ -108,65 +130,80 @@ def adjust_csv(csv_file):
         for row in reader:
             writer.writerow(row)
 
-    # Replace the original file with the modified file
-    os.replace(temp_csv, csv_file)
+    # Replace the original file, or create the output file, with the modified file
+    os.replace(temp_csv, output_file)
+
+    return output_file
+
+def iupac_names_to_smiles(csv_file, output_file):
+    """
+    Convert the 'IUPAC Name' column of a CSV file to SMILES, see from_iupac_to_smiles_conversion.
 
-    return csv_file
+    Args:
+        csv_file (str): Path to the CSV file with IUPAC names.
+        output_file (str): Path of the CSV file with IUPAC names and SMILES.
+    """
+    from_iupac_to_smiles_conversion(csv_file, column_name="IUPAC Name", output_file=output_file)
+
+# Stages from a page view ('pages') to the CSV of IUPAC names and SMILES ('smiles'). The CSV steps
+# write new files instead of rewriting their input, so each intermediate can be memoized. The
+# OPSIN conversion depends on the configured backend (local JVM or web service) and is always run.
+IUPAC_STAGES = MOLECULE_STAGES + [
+    Stage('clean_molecules', csv_cleaning, ['molecules'], {'cleaned_molecules': '{base}_iupac_cleaned.csv'}),
+    Stage('filter_molecules', csv_filtering, ['cleaned_molecules'], {'filtered_molecules': '{base}_iupac_filtered.csv'}),
+    Stage('sort_molecules', csv_sorting, ['filtered_molecules'], {'sorted_molecules': '{base}_iupac_sorted.csv'}),
+    Stage('adjust_molecules', adjust_csv, ['sorted_molecules'], {'iupac_names': '{base}_iupac_names.csv'}),
+    Stage('iupac_to_smiles', iupac_names_to_smiles, ['iupac_names'], {'smiles': '{base}_iupac_smiles.csv'}, memoize=False),
+]
 
 def pdf2iupac_conversion(pdfile_path, start_page, last_page, together):
     """
     Orchestrates the conversion process from PDF to IUPAC names and finally to SMILES format.
 
     Args:
-        pdfile_path (str): Path to the PDF file.
+        pdfile_path (PatentDocument or str): Shared document handle or path to the PDF file.
         start_page (int): First page to extract (1-based index).
         last_page (int): Last page to extract (1-based index).
-        together (bool): Flag to extract pages together into a single file.
+        together (bool): Kept for command-line compatibility. The text pipeline always reads the page range as a single view.
+
+    Returns:
+        str: Path to the CSV file with IUPAC names and SMILES.
     """
     # Create output folder
     output_folder = create_folder_in_working_directory('pdf_to_smiles')
     print(f"Created output folder: {output_folder}")
 
-    # Extract and combine specified page range from PDF
-    combined_pdf = pdf_extraction(pdfile_path, start_page, last_page, output_folder, together)
-    print(f"Extracted PDF: {combined_pdf}")
-
-    # Extract molecules from combined PDF into CSV
-    csv_with_molecules = pdf_molecules_extractor(combined_pdf, output_folder)
-    print(f"CSV with molecules: {csv_with_molecules}")
-
-    # Clean up the CSV
-    cleaned_csv_with_molecules = csv_cleaning(csv_with_molecules)
-    print(f"Cleaned CSV with molecules: {cleaned_csv_with_molecules}")
-
-    # Filter out lines not containing "Example [number]"
-    filtered_csv_with_molecules = csv_filtering(cleaned_csv_with_molecules)
-    print(f"Filtered CSV with molecules: {filtered_csv_with_molecules}")
-
-    # Sort the CSV based on "Example [number]"
-    sorted_csv_with_molecules = csv_sorting(filtered_csv_with_molecules)
-    print(f"Sorted CSV with molecules: {sorted_csv_with_molecules}")
+    # Take the specified page range as a single in-memory view
+    combined_pdf = pdf_extraction(pdfile_path, start_page, last_page, together=True)
+    print(f"Extracted pages: {combined_pdf}")
 
-    # Adjust the CSV format
-    modified_csv_with_molecules = adjust_csv(sorted_csv_with_molecules)
-    print(f"Modified CSV with molecules: {modified_csv_with_molecules}")
+    # Run the stage graph, from the pages to the SMILES, reusing unchanged artifacts of previous runs
+    artifacts = run_stages(IUPAC_STAGES, {'pages': (combined_pdf, combined_pdf.digest())}, output_folder, combined_pdf.stem)
+    if not has_rows(artifacts['molecules']):
+        print("No molecule found.")
+    print(f"CSV with IUPAC names: {artifacts['iupac_names']}")
+    smiles_csv = artifacts['smiles']
 
-    # Convert IUPAC names to SMILES notation
-    from_iupac_to_smiles_conversion(modified_csv_with_molecules, column_name="IUPAC Name")
+    # Remove the intermediate .txt, .xlsx and .csv files of this document; other documents may share the folder
+    remove_intermediate_files(output_folder, combined_pdf.stem)
 
-    # Remove all intermediate .pdf, .txt, .xlsx, and .csv files generated during the process.
-    remove_intermediate_files(output_folder)
+    return smiles_csv
 
-def remove_intermediate_files(output_folder):
+def remove_intermediate_files(output_folder, stem: str):
     """
-    Removes all intermediate files (.pdf, .txt, .xlsx, .csv) except the final '_iupac_smiles.csv' file.
+    Removes the intermediate files (.pdf, .txt, .xlsx, .csv) of one document except the final
+    '_iupac_smiles.csv' file, and the Excel exports of the tables when EXPORT_TABLES_XLSX is set.
+    Files of other documents processed at the same time are left alone.
 
     Args:
         output_folder (str): Path to the folder containing the files to be removed.
+        stem (str): Name the files of the document start with, e.g. '<patent>_extracted'.
     """
     for filename in os.listdir(output_folder):
         file_path = os.path.join(output_folder, filename)
-        if os.path.isfile(file_path) and not filename.endswith('_iupac_smiles.csv'):
+        own = filename.startswith((f"{stem}.", f"{stem}_"))
+        keep = filename.endswith('_iupac_smiles.csv') or (EXPORT_TABLES_XLSX and filename.endswith('.xlsx'))
+        if own and os.path.isfile(file_path) and not keep:
             os.remove(file_path)
 
 def main():
@@ -186,6 +223,7 @@ def main():
         last_page=args.end_page,
         together=args.together
     )
+    run_report.write()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,23 @@
+import os
+import sys
+import unittest
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.activity import parse_activity
+
+class ParseActivityTest(unittest.TestCase):
+    def test_molar_units_are_converted_to_clean_nanomolar_values(self):
+        activity = parse_activity(['19 4.1 mM', '20 1.2 µM', '21 3.3 uM', '22 7 nM', '23 <250 pM', '24 0.1 pM'])
+        self.assertEqual(activity['activity'].tolist(), ['4100000', '1200', '3300', '7', '<0.25', '0.0001'])
+        self.assertEqual(activity['value'].tolist(), [4100000.0, 1200.0, 3300.0, 7.0, 0.25, 0.0001])
+        self.assertEqual(set(activity['unit']), {'nM'})
+        self.assertEqual(activity['qualifier'].tolist(), ['', '', '', '', '<', ''])
+
+    def test_values_without_unit_are_kept_as_written(self):
+        activity = parse_activity(['Example 12,1,500', '12A 35.2'])
+        self.assertEqual(activity['molecule_id'].tolist(), ['Example 12', '12A'])
+        self.assertEqual(activity['activity'].tolist(), ['1500', '35.2'])
+        self.assertEqual(activity['unit'].tolist(), ['', ''])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.cache import MISSING, DiskCache
+from utils.iupac_to_smiles import SmilesCache, convert_names, opsin_version
+
+class ConvertNamesCacheTest(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.cache = SmilesCache(DiskCache(os.path.join(folder.name, "iupac.sqlite")))
+        patcher = mock.patch("utils.iupac_to_smiles.get_smiles_cache", return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_web_negatives_are_stored_and_unanswered_names_are_not(self):
+        # 'bad name' is answered 404 (None), 'down name' gets no answer (MISSING)
+        with mock.patch("utils.iupac_to_smiles.opsin_smiles", return_value=('http', ['C', None, MISSING])):
+            self.assertEqual(convert_names(['methane', 'bad name', 'down name'], backend='http'), ['C', None, None])
+
+        fresh = SmilesCache(self.cache.disk)  # Without the in-memory entries
+        version = opsin_version('http')
+        self.assertEqual(fresh.get('methane', version), 'C')
+        self.assertIsNone(fresh.get('bad name', version))
+        self.assertIs(fresh.get('down name', version), MISSING)
+        self.assertIs(fresh.get('methane', opsin_version('local')), MISSING)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.cache import DiskCache
+from utils.document import PageRange, PatentDocument
+from utils.stages import Stage, run_stages
+
+class RunStagesSkippedPagesTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        cache = DiskCache(os.path.join(self.folder.name, "stages.sqlite"))
+        patcher = mock.patch("utils.stages.get_cache", return_value=cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.document = PatentDocument(os.path.join(self.folder.name, "patent.pdf"))
+        self.calls = []
+
+    def stages(self, skip=None):
+        def text(pages, output):
+            self.calls.append("text")
+            if skip is not None:
+                self.document.skip_page(skip)
+            with open(output, 'w') as f:
+                f.write("".join(f"page {page_index}\n" for page_index in pages))
+
+        def names(text_file, output):
+            self.calls.append("names")
+            with open(text_file) as f, open(output, 'w') as out:
+                out.write(f.read().upper())
+
+        return [
+            Stage("text", text, ['pages'], {'text': "{base}.txt"}),
+            Stage("names", names, ['text'], {'names': "{base}_names.txt"}),
+        ]
+
+    def run_twice(self, pages, first_skip=None):
+        sources = {'pages': (pages, "digest")}
+        run_stages(self.stages(first_skip), sources, self.folder.name, "patent")
+        self.calls.clear()
+        run_stages(self.stages(), sources, self.folder.name, "patent")
+        return self.calls
+
+    def test_page_skipped_while_running_prevents_memoization_downstream(self):
+        pages = PageRange(self.document, [0, 1, 2])
+        self.assertEqual(self.run_twice(pages, first_skip=1), ["text", "names"])
+
+    def test_page_skipped_before_the_stage_prevents_memoization(self):
+        # e.g. its empty text was kept by the document after an earlier stage skipped it
+        self.document.skip_page(2)
+        pages = PageRange(self.document, [0, 1, 2])
+        self.assertEqual(self.run_twice(pages), ["text", "names"])
+
+    def test_skips_outside_the_page_range_do_not_prevent_memoization(self):
+        pages = PageRange(self.document, [0, 1])
+        self.assertEqual(self.run_twice(pages, first_skip=5), [])
+
+if __name__ == "__main__":
+    unittest.main()
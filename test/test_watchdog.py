@@ -0,0 +1,48 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.run_report import RunReport
+from utils.watchdog import PageSkipped, WatchdogPool
+
+class WatchdogPoolTest(unittest.TestCase):
+    def setUp(self):
+        # Record skips in a report of the test, not in the process-wide one
+        self.report = RunReport()
+        patcher = mock.patch("utils.watchdog.run_report", self.report)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_waiting_caller_gets_a_fresh_worker_after_a_timeout(self):
+        # One worker, two callers: the first one is killed for its timeout while the second one
+        # waits for the worker, and must then run on a replacement instead of waiting forever
+        pool = WatchdogPool("test", workers=1)
+        pool.timeout = 1
+        results = {}
+
+        def call(name, seconds):
+            try:
+                results[name] = pool.run(time.sleep, (seconds,), "test.pdf", 0)
+            except PageSkipped as e:
+                results[name] = e
+
+        slow = threading.Thread(target=call, args=("slow", 30))
+        slow.start()
+        time.sleep(0.3)  # Let the slow caller take the only worker
+        fast = threading.Thread(target=call, args=("fast", 0))
+        fast.start()
+        slow.join(10)
+        fast.join(10)
+        pool.close()
+
+        self.assertFalse(fast.is_alive(), "the waiting caller is still blocked")
+        self.assertIsInstance(results["slow"], PageSkipped)
+        self.assertIsNone(results["fast"])
+        self.assertEqual([(skip['stage'], skip['page']) for skip in self.report.skipped], [("test", 1)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+# One line of an activity table or text: '[Example ]<id>' then ',' or spaces, an optional qualifier,
+# the value (possibly with thousands separators) and an optional molar unit
+ACTIVITY_PATTERN = (
+    r'^(?P<prefix>Example\s+)?(?P<molecule_id>[0-9A-Z]+)(?:\s*,\s*|\s+)'
+    r'(?P<qualifier>[<>≤≥]=?|~)?\s*'
+    r'(?P<number>\d{1,3}(?:,\d{3})*|\d+|[\d.,]+)'
+    r'(?:\s*(?P<unit>[pnuµμm]?M))?$'
+)
+
+# Factors converting molar units to nM
+UNIT_FACTORS = {'pM': 1e-3, 'nM': 1.0, 'uM': 1e3, 'µM': 1e3, 'μM': 1e3, 'mM': 1e6, 'M': 1e9}
+NORMALIZED_UNIT = 'nM'
+
+def format_values(values: pd.Series):
+    """Format floats as strings, without a decimal part when they are whole numbers."""
+    whole = values.notna() & np.isfinite(values) & (values == np.floor(values))
+    formatted = values.astype(str)
+    formatted[whole] = values[whole].astype('int64').astype(str)
+    return formatted
+
+def round_significant(values: pd.Series, digits: int = 12):
+    """Round floats to `digits` significant digits, dropping the binary noise of unit conversions (e.g. 4.1 * 1e6)."""
+    return values.map(lambda value: float(f"{value:.{digits}g}"))
+
+def parse_activity(lines):
+    """
+    Parse activity lines in bulk, with a single vectorized regular expression.
+
+    Lines such as 'Example 12,1,500', '12A 35.2', '7 <10 nM' or '3 1.2 µM' are recognized. Values in
+    molar units are converted to nM; values without a unit are kept as written, without their
+    thousands separators.
+
+    Args:
+        lines (iterable): Text or CSV lines.
+
+    Returns:
+        pd.DataFrame: One row per matching line, in order, with the columns 'molecule_id' (str),
+            'qualifier' (str, empty if none), 'value' (float, NaN if not a number), 'unit' (str, empty
+            if none) and 'activity' (str, qualifier and value as written to the activity CSV).
+    """
+    lines = pd.Series(list(lines), dtype=object).str.strip()
+    parts = lines.str.extract(ACTIVITY_PATTERN).dropna(subset=['molecule_id'])
+
+    number = parts['number'].str.replace(',', '', regex=False)
+    value = pd.to_numeric(number, errors='coerce')
+    unit = parts['unit'].fillna('')
+    qualifier = parts['qualifier'].fillna('')
+
+    # Convert every value with a known unit at once
+    factor = unit.map(UNIT_FACTORS)
+    converted = factor.notna() & value.notna()
+    value = value.where(~converted, round_significant(value[converted] * factor[converted]))
+    number = number.where(~converted, format_values(value))
+    unit = unit.where(~converted, NORMALIZED_UNIT)
+
+    return pd.DataFrame({
+        'molecule_id': parts['prefix'].fillna('') + parts['molecule_id'],
+        'qualifier': qualifier,
+        'value': value,
+        'unit': unit,
+        'activity': qualifier + number,
+    }).reset_index(drop=True)
+
+def activity_dict(activity: pd.DataFrame):
+    """
+    Map molecule IDs to their activity, the last line winning when an ID appears twice.
+
+    Args:
+        activity (pd.DataFrame): Parsed activity, see parse_activity.
+
+    Returns:
+        dict: Dictionary containing molecule IDs as keys and activity data as values.
+    """
+    return dict(zip(activity['molecule_id'], activity['activity']))
+
+def normalize_molecule_ids(molecule_ids: pd.Series):
+    """
+    Collapse the spaces of molecule IDs and make sure each one starts with 'Example'.
+
+    Args:
+        molecule_ids (pd.Series): Molecule IDs.
+
+    Returns:
+        pd.Series: Normalized molecule IDs, as strings.
+    """
+    molecule_ids = molecule_ids.astype(str).str.replace(r'\s+', ' ', regex=True).str.strip()
+    return molecule_ids.where(molecule_ids.str.startswith('Example'), 'Example ' + molecule_ids)
+
+def natural_sort(df: pd.DataFrame, column: str = 'molecule_id'):
+    """
+    Sort rows by 'Example <number><letter>' IDs: by number, then by letter. IDs of another form
+    sort as number 0, by their full ID.
+
+    Args:
+        df (pd.DataFrame): Rows to sort.
+        column (str, optional): Column holding the IDs. Defaults to 'molecule_id'.
+
+    Returns:
+        pd.DataFrame: Sorted rows.
+    """
+    ids = df[column].astype(str)
+    parts = ids.str.extract(r'^Example (?P<number>\d+)(?P<suffix>[A-Za-z]?)')
+    matched = parts['number'].notna()
+    keys = pd.DataFrame({
+        'number': pd.to_numeric(parts['number']).fillna(0).to_numpy(),
+        'suffix': parts['suffix'].where(matched, ids).to_numpy(),
+    })
+    # Sort positions rather than labels, concatenated frames may repeat index labels
+    order = keys.sort_values(['number', 'suffix'], kind='stable').index
+    return df.iloc[order]
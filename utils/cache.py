@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_DIR = os.environ.get("PATENT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "patent_analyzer"))
+CACHE_MAX_BYTES = int(os.environ.get("PATENT_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))  # 2 GB
+CACHE_ENABLED = os.environ.get("PATENT_CACHE", "1") != "0"
+
+MISSING = object()  # Returned by DiskCache.get when a key is not stored
+
+def cache_key(*parts):
+    """
+    Build a content-addressed cache key from JSON-serializable parts, e.g. the extractor
+    name, its version, its settings and the fingerprint of the page it reads.
+
+    Returns:
+        str: SHA-256 hex digest of the parts.
+    """
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+class DiskCache:
+    """
+    Persistent key-value store in a local SQLite file, for JSON-serializable values.
+
+    When the stored values grow over `max_bytes`, the least recently used entries are evicted
+    until the store is back under 90% of the limit. The file can be shared by several threads
+    and processes.
+    """
+    EVICTION_INTERVAL = 64  # Puts between two size checks
+
+    def __init__(self, path, max_bytes: int = CACHE_MAX_BYTES):
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._puts = 0
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self.evict()
+
+    def get(self, key: str, default=MISSING):
+        """
+        Get a stored value and mark it as recently used.
+
+        Returns:
+            The stored value, or `default` if the key is not stored.
+        """
+        with self._lock, self._connection:
+            row = self._connection.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return default
+            self._connection.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key: str, value):
+        """Store a JSON-serializable value under `key`."""
+        data = json.dumps(value)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, data, len(data), time.time()),
+            )
+            self._puts += 1
+            check_size = self._puts % self.EVICTION_INTERVAL == 0
+        if check_size:
+            self.evict()
+
+    def size(self):
+        """Total size in bytes of the stored values."""
+        with self._lock:
+            return self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def evict(self):
+        """Drop least recently used entries until the store is under 90% of `max_bytes`."""
+        total = self.size()
+        if total <= self.max_bytes:
+            return
+        target = total - int(self.max_bytes * 0.9)
+        with self._lock, self._connection:
+            freed = 0
+            keys = []
+            for key, size in self._connection.execute("SELECT key, size FROM entries ORDER BY last_access"):
+                keys.append((key,))
+                freed += size
+                if freed >= target:
+                    break
+            self._connection.executemany("DELETE FROM entries WHERE key = ?", keys)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_cache(name: str = "extraction"):
+    """
+    Get the process-wide cache stored as `<CACHE_DIR>/<name>.sqlite`.
+
+    Returns:
+        DiskCache or None: The cache, or None if caching is disabled with PATENT_CACHE=0.
+    """
+    if not CACHE_ENABLED:
+        return None
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = DiskCache(os.path.join(CACHE_DIR, f"{name}.sqlite"))
+        return _caches[name]
+
+def cached(cache, key: str, compute):
+    """
+    Return the value stored under `key`, computing and storing it on a miss.
+
+    Args:
+        cache (DiskCache or None): Cache to use; None computes without caching.
+        key (str): Cache key, see cache_key.
+        compute (callable): Function without arguments computing the value.
+    """
+    if cache is None:
+        return compute()
+    value = cache.get(key)
+    if value is MISSING:
+        value = compute()
+        cache.put(key, value)
+    return value
@@ -0,0 +1,91 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from utils.watchdog import worker_context
+
+CDE_WORKERS = int(os.environ.get("CDE_WORKERS", "1"))  # Default size of the ChemDataExtractor process pool
+CDE_BATCH_SIZE = int(os.environ.get("CDE_BATCH_SIZE", "32"))  # Paragraphs sent to a worker at once
+
+def load_cde():
+    """
+    Import ChemDataExtractor and load its models by parsing a short sentence, so that a worker
+    process pays the loading cost once, before its first batch.
+    """
+    from chemdataextractor.doc import Document
+
+    Document('Example 1').records.serialize()
+
+def molecule_names(paragraph):
+    """
+    Parse a paragraph with ChemDataExtractor and get the names of the compounds it describes.
+
+    Args:
+        paragraph (str): Paragraph to parse.
+
+    Returns:
+        list: First name of each compound, cut at its first space.
+    """
+    from chemdataextractor.doc import Document
+
+    names = []
+    for compound in Document(paragraph).records.serialize():
+        if compound.get('names'):
+            molecule_name = compound['names'][0]
+            if ' ' in molecule_name:
+                molecule_name = molecule_name.split(' ')[0]
+            names.append(molecule_name)
+    return names
+
+def parse_batch(paragraphs):
+    """Molecule names of each paragraph of a batch, in order."""
+    return [molecule_names(paragraph) for paragraph in paragraphs]
+
+def batches(items, batch_size: int):
+    """Split an iterable into lists of at most `batch_size` items, lazily."""
+    items = iter(items)
+    while True:
+        batch = list(islice(items, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def parse_paragraphs(jobs, workers: int = None, batch_size: int = CDE_BATCH_SIZE):
+    """
+    Parse paragraphs with ChemDataExtractor, in batches spread over a process pool when more
+    than one worker is requested. Each worker loads the models once, and results come back
+    in the order of `jobs`.
+
+    Jobs are read lazily: at most two batches per worker are in flight at once.
+
+    Args:
+        jobs (iterable): (key, paragraph) pairs, e.g. the example number and its paragraph.
+        workers (int, optional): Number of parsing processes. Defaults to the CDE_WORKERS environment variable, or 1.
+        batch_size (int, optional): Paragraphs per batch. Defaults to CDE_BATCH_SIZE.
+
+    Yields:
+        tuple: (key, list of molecule names) for each job.
+    """
+    workers = workers if workers else CDE_WORKERS
+
+    if workers <= 1:
+        for key, paragraph in jobs:
+            yield key, molecule_names(paragraph)
+        return
+
+    # Workers come from a fork server, so they never inherit a lock held by another thread of the parent
+    with ProcessPoolExecutor(max_workers=workers, initializer=load_cde, mp_context=worker_context()) as executor:
+        pending = deque()
+        for batch in batches(jobs, max(1, batch_size)):
+            keys, paragraphs = zip(*batch)
+            pending.append((keys, executor.submit(parse_batch, paragraphs)))
+            # Wait for the oldest batch before reading more jobs, which also keeps the order
+            if len(pending) >= 2 * workers:
+                keys, future = pending.popleft()
+                yield from zip(keys, future.result())
+        while pending:
+            keys, future = pending.popleft()
+            yield from zip(keys, future.result())
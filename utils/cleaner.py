@@ -4,16 +4,19 @@ import shutil
 
 from pathlib import Path
 
-def csv_cleaning(csv_file: Path):
+def csv_cleaning(csv_file: Path, output_file: Path = None):
     """
     Clean the contents of a CSV file by removing unwanted characters.
     
     Args:
     - csv_file (Path): Path object representing the CSV file to be cleaned.
+    - output_file (Path, optional): Path of the cleaned CSV file. Defaults to cleaning csv_file in place.
     
     Returns:
     - csv_file (Path): Path object representing the cleaned CSV file.
     """
+    output_file = output_file if output_file else csv_file
+
     # Read all lines from the CSV file
     with open(csv_file, 'r', encoding='utf-8') as file:
         lines = file.readlines()
@@ -29,11 +32,11 @@ def csv_cleaning(csv_file: Path):
         line = line.replace("'", '"')
         cleaned_lines.append(line)
     
-    # Write the cleaned content back to the same file
-    with open(csv_file, 'w', encoding='utf-8') as file:
+    # Write the cleaned content back to the same file, or to the output file
+    with open(output_file, 'w', encoding='utf-8') as file:
         file.writelines(cleaned_lines)
 
-    return csv_file
+    return output_file
 
 def folder_cleaner(directory):
     """
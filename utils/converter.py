@@ -1,17 +1,214 @@
 import csv
+import math
 import os
 import pandas as pd
-import pdfplumber
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from openpyxl import load_workbook
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from utils.cache import MISSING, cache_key, get_cache
+from utils.document import as_page_range, worker_document
+from utils.watchdog import PageSkipped, run_pages, watchdog_enabled, worker_context
 
-def pdf_to_excel(pdfile_path: Path, excel_file: Path, overwrite=False):
+EXPORT_TABLES_XLSX = os.environ.get("EXPORT_TABLES_XLSX", "0") == "1"  # Also write the extracted tables to an Excel file, for debugging
+TABLE_WORKERS = int(os.environ.get("TABLE_WORKERS", "1"))  # Default size of the pdfplumber process pool
+SHARDS_PER_WORKER = 4  # Page shards queued per worker, so that slow pages do not leave workers idle
+
+def pdfplumber_version():
+    import pdfplumber
+    return pdfplumber.__version__
+
+def extract_shard_tables(pdf_path, page_indices):
+    """
+    Extract the tables of a shard of pages in a worker process, with its own pdfplumber document,
+    opened once per worker and file (see worker_document).
+
+    Args:
+        pdf_path (str or Path): Path to the PDF file.
+        page_indices (list): Pages to read (0-based indices).
+
+    Returns:
+        list: (tables, error) for each page, error being None or the message of the exception raised.
+    """
+    pdf = worker_document(str(pdf_path), "plumber")
+    results = []
+    for page_index in page_indices:
+        try:
+            results.append((pdf.pages[page_index].extract_tables(), None))
+        except Exception as e:
+            results.append((None, str(e)))
+    return results
+
+def read_page_tables(pages, workers: int = None):
+    """
+    Extract the raw pdfplumber tables of each page of a view, spreading the pages that are not
+    in the on-disk cache over a process pool, by shards of consecutive pages.
+
+    When the 'tables' stage has a time budget (PAGE_TIMEOUT or PAGE_TIMEOUT_TABLES), pages are read
+    one by one in watchdog workers instead, and a page that goes over the budget gets a PageSkipped
+    exception.
+
+    Args:
+        pages (PageRange): Page view to read.
+        workers (int, optional): Number of pdfplumber processes. Defaults to the TABLE_WORKERS environment variable, or 1.
+
+    Returns:
+        dict: Tables of each page index, or the exception raised while reading the page.
+    """
+    workers = workers if workers else TABLE_WORKERS
+    cache = get_cache()
+    results = {}
+    keys = {}
+
+    # Reuse the tables of pages whose content was already read
+    for i in pages:
+        try:
+            with pages.document.lock:
+                keys[i] = cache_key("tables", pdfplumber_version(), pages.document.fingerprint(i))
+            tables = cache.get(keys[i]) if cache is not None else MISSING
+            if tables is not MISSING:
+                results[i] = tables
+        except Exception as e:
+            results[i] = e
+    missing = [i for i in pages if i not in results]
+
+    if watchdog_enabled("tables"):
+        # One page per task, so that the budget applies to each page
+        page_results = run_pages("tables", extract_shard_tables, {i: (str(pages.path), [i]) for i in missing}, pages.document.name, workers)
+        for i, result in page_results.items():
+            if isinstance(result, PageSkipped):
+                pages.document.skip_page(i)
+            if isinstance(result, Exception):
+                results[i] = result
+            else:
+                tables, error = result[0]
+                results[i] = tables if error is None else RuntimeError(error)
+    elif workers <= 1 or len(missing) <= 1:
+        # Read the pages with the shared pdfplumber document
+        for i in missing:
+            try:
+                with pages.document.lock:
+                    results[i] = pages.document.plumber_page(i).extract_tables()
+            except Exception as e:
+                results[i] = e
+    else:
+        shard_size = max(1, math.ceil(len(missing) / (workers * SHARDS_PER_WORKER)))
+        shards = [missing[start:start + shard_size] for start in range(0, len(missing), shard_size)]
+        # Workers come from a fork server: a forked child could inherit the document lock held by another thread
+        with ProcessPoolExecutor(max_workers=min(workers, len(shards)), mp_context=worker_context()) as executor:
+            for shard, shard_results in zip(shards, executor.map(extract_shard_tables, [pages.path] * len(shards), shards)):
+                for i, (tables, error) in zip(shard, shard_results):
+                    results[i] = tables if error is None else RuntimeError(error)
+
+    if cache is not None:
+        for i in missing:
+            if not isinstance(results[i], Exception):
+                cache.put(keys[i], results[i])
+
+    return results
+
+def extract_tables(pdfile_path, workers: int = None):
+    """
+    Extract the tables of a PDF in memory, in the layout pdf_to_excel used to give the workbook:
+    one entry per sheet, named 'Page_<page>_Table_<table>', holding the header row and the data
+    rows, plus a single 'No_Tables' entry without rows if a page has no tables.
+
+    Pages are read in parallel (see read_page_tables), then merged in page order, so headers
+    carry over from one page to the next as in a sequential read.
+
+    Args:
+        pdfile_path (PageRange or Path): Page view or path to the input PDF file.
+        workers (int, optional): Number of pdfplumber processes. Defaults to the TABLE_WORKERS environment variable, or 1.
+
+    Returns:
+        tuple: (tables_extracted, tables), where tables_extracted is True if any page had tables and
+            tables is a list of (sheet_name, rows) pairs in page order.
+    """
+    tables_extracted = False
+    previous_headers = None
+    sheets = {}
+
+    # Extract the tables of every page, then merge them in page order
+    pages = as_page_range(pdfile_path)
+    page_tables = read_page_tables(pages, workers)
+    for i in pages:
+        try:
+            tables = page_tables[i]
+            if isinstance(tables, Exception):
+                raise tables
+            if tables:
+                tables_extracted = True
+                for j, table in enumerate(tables):
+                    if len(table) > 1:
+                        # Handle inconsistent headers by using previous headers
+                        if previous_headers and len(table[0]) != len(previous_headers):
+                            table[0] = previous_headers
+                        else:
+                            previous_headers = table[0]
+
+                        # Rows must match the header and short rows are padded, as when they were loaded into a DataFrame
+                        width = max(len(row) for row in table[1:])
+                        if width != len(table[0]):
+                            raise ValueError(f"{len(table[0])} columns passed, passed data had {width} columns")
+                        sheets[f'Page_{i+1}_Table_{j+1}'] = [list(table[0])] + [list(row) + [None] * (width - len(row)) for row in table[1:]]
+            else:
+                # If no tables found, keep an empty sheet
+                sheets.setdefault('No_Tables', [])
+        except Exception as e:
+            print(f"Error extracting table from page {i+1}: {e}")
+
+    # Keep at least one sheet, e.g. when triage left no table pages to read
+    if not sheets:
+        sheets['No_Tables'] = []
+
+    return tables_extracted, list(sheets.items())
+
+def table_rows(tables):
+    """
+    Flatten in-memory tables into rows of strings, as excel_to_csv writes the exported workbook:
+    empty cells become 'None', newlines in cells become spaces, and empty sheets give one 'None' row.
+
+    Args:
+        tables (list): (sheet_name, rows) pairs, see extract_tables.
+
+    Yields:
+        list: Row of cell strings.
+    """
+    for _, rows in tables:
+        for row in rows if rows else [[None]]:
+            yield [str(cell).replace('\n', ' ').replace('\r', '') for cell in row]
+
+def tables_to_excel(tables, excel_file: Path):
+    """
+    Export in-memory tables to an Excel file, one sheet per table, for debugging.
+
+    Args:
+        tables (list): (sheet_name, rows) pairs, see extract_tables.
+        excel_file (Path): Path to the output Excel file.
+    """
+    with pd.ExcelWriter(excel_file, engine='openpyxl') as writer:
+        for sheet_name, rows in tables:
+            df = pd.DataFrame(rows[1:], columns=rows[0]) if rows else pd.DataFrame({})
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+
+def tables_to_csv(tables, csv_file: Path):
+    """
+    Write in-memory tables to a CSV file, with the rows excel_to_csv gives for their workbook.
+
+    Args:
+        tables (list): (sheet_name, rows) pairs, see extract_tables.
+        csv_file (Path): Path to the output CSV file.
+    """
+    with open(csv_file, 'w', newline='', encoding='utf-8') as csvfile:
+        csv.writer(csvfile, delimiter=',').writerows(table_rows(tables))
+
+def pdf_to_excel(pdfile_path, excel_file: Path, overwrite=False):
     """
     Convert tables from a PDF file to an Excel file.
 
     Args:
-        pdfile_path (Path): Path to the input PDF file.
+        pdfile_path (PageRange or Path): Page view or path to the input PDF file.
         excel_file (Path): Path to the output Excel file.
         overwrite (bool, optional): Whether to overwrite existing Excel file. Defaults to False.
     
@@ -21,40 +218,8 @@ def pdf_to_excel(pdfile_path: Path, excel_file: Path, overwrite=False):
     if not overwrite and os.path.exists(excel_file):
         raise ValueError("Excel file already exists. Set overwrite=True to overwrite.")
 
-    # Initialize Excel writer
-    writer = pd.ExcelWriter(excel_file, engine='openpyxl')
-    tables_extracted = False
-    previous_headers = None
-    
-    # Open PDF file using pdfplumber
-    with pdfplumber.open(pdfile_path) as pdf:
-        for i, page in enumerate(pdf.pages):
-            try:
-                # Extract tables from each page
-                tables = page.extract_tables()
-                if tables:
-                    tables_extracted = True
-                    for j, table in enumerate(tables):
-                        if len(table) > 1:
-                            # Handle inconsistent headers by using previous headers
-                            if previous_headers and len(table[0]) != len(previous_headers):
-                                table[0] = previous_headers
-                            else:
-                                previous_headers = table[0]
-                            
-                            # Convert table to DataFrame and write to Excel sheet
-                            df = pd.DataFrame(table[1:], columns=table[0])
-                            sheet_name = f'Page_{i+1}_Table_{j+1}'
-                            df.to_excel(writer, sheet_name=sheet_name, index=False)
-                else:
-                    # If no tables found, create an empty sheet
-                    df = pd.DataFrame({})
-                    df.to_excel(writer, sheet_name='No_Tables', index=False)
-            except Exception as e:
-                print(f"Error extracting table from page {i+1}: {e}")
-    
-    # Close the Excel writer
-    writer.close()
+    tables_extracted, tables = extract_tables(pdfile_path)
+    tables_to_excel(tables, excel_file)
     return tables_extracted
 
 def excel_to_csv(excel_file: Path, csv_file: Path):
@@ -65,6 +230,8 @@ def excel_to_csv(excel_file: Path, csv_file: Path):
         excel_file (Path): Path to the input Excel file.
         csv_file (Path): Path to the output CSV file.
     """
+    from openpyxl import load_workbook
+
     try:
         # Load Excel workbook
         wb = load_workbook(excel_file)
@@ -1,43 +1,208 @@
-import os
-os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'  # 0 (default) to print all logs, 1 to print only INFO logs, 3 to print only ERROR logs
-
-from DECIMER import predict_SMILES
-from pathlib import Path
-
-def SMILES_prediction(image_path: Path, output_file: str):
-    """
-    Predict SMILES representations from PNG images in a directory and write results to a file.
-
-    Args:
-        image_path (Path): Path to the directory containing PNG images.
-        output_file (str): Name of the output file to store results.
-
-    """
-    with open(output_file, "w") as f:
-        # Find all PNG files in the specified directory
-        png_files = [f for f in os.listdir(image_path) if f.endswith(".png")]     
-        print(f"Number of PNG files found: {len(png_files)}")
-        
-        # Process each PNG file
-        for png_file in png_files:
-            png_file_path = os.path.join(image_path, png_file)
-            print(f"Processing file: {png_file_path}")
-            
-            # Predict SMILES for the current PNG file using DECIMER
-            SMILES = predict_SMILES(png_file_path)         
-            print(f"File: {png_file}, SMILES: {SMILES}")
-            
-            # Write the results to the output file
-            if SMILES:
-                f.write(f"{png_file},{SMILES}\n")                
-            else:
-                print(f"Warning: No SMILES found for the file {png_file}")
-
-if __name__ == '__main__':
-    import argparse
-    parser = argparse.ArgumentParser(description="Brief description of the tool")
-    parser.add_argument("-p", "--path", required=True, help="Path to the directory containing PNG images.")
-    parser.add_argument("-o", "--output", required=True, help= "Output file name.")
-    args = parser.parse_args()
-
-    SMILES_prediction(Path(args.path), args.output)
\ No newline at end of file
+import os
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'  # 0 (default) to print all logs, 1 to print only INFO logs, 3 to print only ERROR logs
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from utils.chemdata import batches
+from utils.cache import MISSING
+from utils.inference_server import ServerUnavailable, request
+from utils.run_report import run_report
+from utils.segment_cache import decimer_version, get_segment_cache, gray_image, pixel_digest
+from utils.tf_config import configure_tensorflow
+
+DECIMER_BATCH_SIZE = int(os.environ.get("DECIMER_BATCH_SIZE", "8"))  # Images decoded ahead of the model at once, 1 to predict one image at a time
+
+def image_decoder():
+    """
+    Image decoder of DECIMER's predict_SMILES, so that batched predictions see the same input:
+    config.decode_image, or pre_process.decode_image in the DECIMER versions that moved it there.
+    """
+    from DECIMER import config
+    if hasattr(config, 'decode_image'):
+        return config.decode_image
+    from DECIMER import pre_process
+    return pre_process.decode_image
+
+def decode_batch(images, executor):
+    """
+    Start decoding a batch of images into DECIMER input tensors on a thread pool.
+
+    Args:
+        images (list): Image paths or arrays.
+        executor (ThreadPoolExecutor): Pool running the decoding.
+
+    Returns:
+        list: Futures of the decoded tensors, in order.
+    """
+    decode_image = image_decoder()
+    return [executor.submit(decode_image, image) for image in images]
+
+def predict_batches(images, batch_size: int = DECIMER_BATCH_SIZE):
+    """
+    Predict the SMILES of a sequence of images, batch by batch.
+
+    When an inference server is running (see utils/inference_server.py), batches are sent to it,
+    as its models are already loaded; otherwise the models are loaded in this process. The
+    packaged DECIMER model is traced for a single image, so each batch is decoded on a
+    thread pool while the model runs on the previous batch, then fed to the model image by
+    image, as predict_SMILES does. Decoding (contrast, binarization, resizing, PNG round trip)
+    is thus taken off the inference path.
+
+    Args:
+        images (list): Image paths or arrays.
+        batch_size (int, optional): Images per batch. Defaults to the DECIMER_BATCH_SIZE environment variable, or 8.
+
+    Yields:
+        str: Predicted SMILES of each image, in order.
+    """
+    images = list(images)
+    while images:
+        try:
+            smiles = request('predict_smiles', images[:max(1, batch_size)], batch_size)
+        except ServerUnavailable:
+            break
+        yield from smiles
+        images = images[max(1, batch_size):]
+    if not images:
+        # The server answered every image: do not load the models here
+        return
+
+    # DECIMER loads TensorFlow and its models on import, so only pay for it when predicting
+    configure_tensorflow()
+    if batch_size <= 1:
+        from DECIMER import predict_SMILES
+        for image in images:
+            yield predict_SMILES(image)
+        return
+
+    import tensorflow as tf
+    from DECIMER import decimer
+
+    def predict(decoded):
+        for future in decoded:
+            output = decimer.DECIMER_V2(tf.constant(future.result()))
+            # Newer models also return the confidence of each token
+            predicted_tokens = output[0] if isinstance(output, tuple) else output
+            yield decimer.utils.decoder(decimer.detokenize_output(predicted_tokens))
+
+    with ThreadPoolExecutor(max_workers=min(batch_size, os.cpu_count() or 1)) as executor:
+        pending = None
+        for batch in batches(images, batch_size):
+            # Decode the next batch while the model works on the current one
+            decoded = decode_batch(batch, executor)
+            if pending is not None:
+                yield from predict(pending)
+            pending = decoded
+        if pending is not None:
+            yield from predict(pending)
+
+def predict_cached(images, batch_size: int = DECIMER_BATCH_SIZE):
+    """
+    Predict the SMILES of a sequence of segment images, reusing the predictions stored in the
+    segment cache for identical images, or near-identical ones when PHASH_MAX_DISTANCE is set
+    (see utils/segment_cache.py). Only the other images go through the model, in batches. Hits
+    and misses are counted in the run report.
+
+    Args:
+        images (list): Normalized segment images, as paths or arrays.
+        batch_size (int, optional): Images per prediction batch. Defaults to the DECIMER_BATCH_SIZE environment variable, or 8.
+
+    Yields:
+        str: Predicted SMILES of each image, in order.
+    """
+    images = list(images)
+    cache = get_segment_cache()
+    if cache is None:
+        yield from predict_batches(images, batch_size)
+        return
+
+    model = decimer_version()
+    grays = [gray_image(image) for image in images]
+    found = [cache.get(gray, model) for gray in grays]
+
+    # Images missing from the cache are predicted once, even when they repeat in this sequence
+    digests = [pixel_digest(gray) if smiles is MISSING else None for gray, (smiles, _) in zip(grays, found)]
+    positions = {}
+    for index, digest in enumerate(digests):
+        if digest is not None and digest not in positions:
+            positions[digest] = index
+    repeats = sum(1 for digest in digests if digest is not None) - len(positions)
+    run_report.count("segment_cache_exact_hits", sum(1 for _, hit in found if hit == 'exact') + repeats)
+    run_report.count("segment_cache_near_hits", sum(1 for _, hit in found if hit == 'near'))
+    run_report.count("segment_cache_misses", len(positions))
+
+    # Predict the misses lazily, in order, while hits are answered from the cache
+    predictions = predict_batches([images[index] for index in positions.values()], batch_size)
+    predicted = {}
+    for gray, digest, (smiles, _) in zip(grays, digests, found):
+        if smiles is MISSING:
+            if digest not in predicted:
+                predicted[digest] = next(predictions)
+                cache.put(gray, model, predicted[digest])
+            smiles = predicted[digest]
+        yield smiles
+
+def prediction_rows(names, images, batch_size: int = DECIMER_BATCH_SIZE):
+    """
+    Predict the SMILES of named segment images.
+
+    Args:
+        names (list): Segment names, e.g. their PNG file names.
+        images (list): Normalized segment images, as paths or arrays, in the order of `names`.
+        batch_size (int, optional): Images per prediction batch. Defaults to the DECIMER_BATCH_SIZE environment variable, or 8.
+
+    Yields:
+        tuple: (name, SMILES) of each segment with a prediction, in order.
+    """
+    for name, SMILES in zip(names, predict_cached(images, batch_size)):
+        print(f"File: {name}, SMILES: {SMILES}")
+        if SMILES:
+            yield name, SMILES
+        else:
+            print(f"Warning: No SMILES found for the file {name}")
+
+def predict_segments(segments, batch_size: int = DECIMER_BATCH_SIZE):
+    """
+    Predict the SMILES of in-memory segments, as returned by chemical_structure_segmentation.
+
+    Args:
+        segments (list): Segments, with their name and normalized image.
+        batch_size (int, optional): Images per prediction batch. Defaults to the DECIMER_BATCH_SIZE environment variable, or 8.
+
+    Yields:
+        tuple: (name, SMILES) of each segment with a prediction, in order.
+    """
+    segments = list(segments)
+    yield from prediction_rows([segment.name for segment in segments], [segment.image for segment in segments], batch_size)
+
+def SMILES_prediction(image_path: Path, output_file: str, batch_size: int = DECIMER_BATCH_SIZE):
+    """
+    Predict SMILES representations from PNG images in a directory and write results to a file.
+
+    Args:
+        image_path (Path): Path to the directory containing PNG images.
+        output_file (str): Name of the output file to store results.
+        batch_size (int, optional): Images per prediction batch. Defaults to the DECIMER_BATCH_SIZE environment variable, or 8.
+
+    """
+    with open(output_file, "w") as f:
+        # Find all PNG files in the specified directory
+        png_files = [f for f in os.listdir(image_path) if f.endswith(".png")]
+        print(f"Number of PNG files found: {len(png_files)}")
+        png_file_paths = [os.path.join(image_path, png_file) for png_file in png_files]
+
+        # Process the PNG files batch by batch, in order, and write the results to the output file
+        for png_file, SMILES in prediction_rows(png_files, png_file_paths, batch_size):
+            f.write(f"{png_file},{SMILES}\n")
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Brief description of the tool")
+    parser.add_argument("-p", "--path", required=True, help="Path to the directory containing PNG images.")
+    parser.add_argument("-o", "--output", required=True, help= "Output file name.")
+    parser.add_argument("-b", "--batch_size", type=int, default=DECIMER_BATCH_SIZE, help=f"Images per prediction batch. Default = {DECIMER_BATCH_SIZE}")
+    args = parser.parse_args()
+
+    SMILES_prediction(Path(args.path), args.output, args.batch_size)
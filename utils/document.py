@@ -0,0 +1,337 @@
+import hashlib
+import os
+import sys
+import threading
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from utils.cache import cache_key, cached, get_cache
+from utils.watchdog import PageSkipped, run_page, watchdog_enabled
+
+class PatentDocument:
+    """
+    Shared handle on a patent PDF, opened once per job and passed to every pipeline.
+
+    The PyMuPDF (fitz) document, the pdfplumber document and the PyPDF2 reader are only
+    opened the first time a stage asks for them, and page text layers are loaded and
+    cached page by page. Page indices are 0-based, as in PyMuPDF.
+
+    The backends are not thread-safe: code that works on page objects directly while
+    other pipelines share the handle should hold `document.lock`.
+    """
+    def __init__(self, pdfile_path):
+        self.path = Path(pdfile_path)
+        self.stem = self.path.stem
+        self.name = self.path.name
+        self.lock = threading.RLock()
+        self._fitz_doc = None
+        self._plumber_doc = None
+        self._pypdf_reader = None
+        self._texts = {}
+        self._fingerprints = {}
+        self._skipped_pages = set()
+        self.triage = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __fspath__(self):
+        return str(self.path)
+
+    def __repr__(self):
+        return f"PatentDocument({str(self.path)!r})"
+
+    @property
+    def fitz(self):
+        """PyMuPDF document, opened on first use."""
+        with self.lock:
+            if self._fitz_doc is None:
+                import fitz
+                self._fitz_doc = fitz.open(self.path)
+            return self._fitz_doc
+
+    @property
+    def plumber(self):
+        """pdfplumber document, opened on first use."""
+        with self.lock:
+            if self._plumber_doc is None:
+                import pdfplumber
+                self._plumber_doc = pdfplumber.open(self.path)
+            return self._plumber_doc
+
+    @property
+    def pypdf(self):
+        """PyPDF2 reader, opened on first use."""
+        with self.lock:
+            if self._pypdf_reader is None:
+                from PyPDF2 import PdfReader
+                self._pypdf_reader = PdfReader(self.path)
+            return self._pypdf_reader
+
+    @property
+    def page_count(self):
+        return len(self.fitz)
+
+    def fitz_page(self, page_index: int):
+        """Load a PyMuPDF page object."""
+        with self.lock:
+            return self.fitz.load_page(page_index)
+
+    def plumber_page(self, page_index: int):
+        """Get a pdfplumber page object."""
+        with self.lock:
+            return self.plumber.pages[page_index]
+
+    def pypdf_page(self, page_index: int):
+        """Get a PyPDF2 page object."""
+        with self.lock:
+            return self.pypdf.pages[page_index]
+
+    def fingerprint(self, page_index: int):
+        """
+        Hash of what a page draws: its content stream, the raw streams of its images, the
+        definitions of its fonts, its boxes and rotation. Identical pages get the same
+        fingerprint across re-runs, page ranges and files, which makes it a content-addressed
+        key for cached extraction results.
+
+        Args:
+            page_index (int): Page to hash (0-based index).
+
+        Returns:
+            str: SHA-256 hex digest.
+        """
+        with self.lock:
+            if page_index not in self._fingerprints:
+                doc = self.fitz
+                page = self.fitz_page(page_index)
+                digest = hashlib.sha256()
+                digest.update(f"{page.rect}|{page.cropbox}|{page.rotation}".encode('utf-8'))
+                digest.update(page.read_contents())
+                for image in page.get_images(full=True):
+                    digest.update(doc.xref_stream_raw(image[0]) or b"")
+                for font in page.get_fonts(full=True):
+                    digest.update(doc.xref_object(font[0]).encode('utf-8'))
+                self._fingerprints[page_index] = digest.hexdigest()
+            return self._fingerprints[page_index]
+
+    def skip_page(self, page_index: int):
+        """Record that a stage skipped a page (see utils/watchdog.py), so its results are incomplete."""
+        with self.lock:
+            self._skipped_pages.add(page_index)
+
+    def has_skipped(self, page_indices):
+        """Whether a stage skipped any of the pages, e.g. those of a PageRange."""
+        with self.lock:
+            return any(page_index in self._skipped_pages for page_index in page_indices)
+
+    def get_text(self, page_index: int, backend: str = "fitz"):
+        """
+        Get the text layer of a page, extracting it on first request. Extracted text is also
+        kept in the on-disk cache, keyed by the page fingerprint and the backend version.
+
+        Unless the 'text' stage has no time budget, the text is extracted in a watchdog worker,
+        and a page that goes over the budget is read as having no text layer.
+
+        Args:
+            page_index (int): Page to read (0-based index).
+            backend (str, optional): 'fitz' for PyMuPDF or 'pypdf' for PyPDF2. Defaults to 'fitz'.
+
+        Returns:
+            str: Extracted text, empty if the page has no text layer.
+        """
+        key = (page_index, backend)
+        with self.lock:
+            if key not in self._texts:
+                if backend == "fitz":
+                    import fitz
+                    version = fitz.VersionBind
+                    extract = lambda: self.fitz_page(page_index).get_text() or ""
+                elif backend == "pypdf":
+                    import PyPDF2
+                    version = PyPDF2.__version__
+                    extract = lambda: self.pypdf_page(page_index).extract_text() or ""
+                else:
+                    raise ValueError(f"Unknown text backend: {backend}")
+                if watchdog_enabled("text"):
+                    extract = lambda: run_page("text", page_text, (str(self.path), page_index, backend), self.name, page_index)
+                try:
+                    self._texts[key] = cached(get_cache(), cache_key("text", backend, version, self.fingerprint(page_index)), extract)
+                except PageSkipped:
+                    # Not cached on disk: the page gets another chance in the next run
+                    self._skipped_pages.add(page_index)
+                    self._texts[key] = ""
+            return self._texts[key]
+
+    def close(self):
+        """Close every backend that was opened and drop cached page data."""
+        with self.lock:
+            if self._fitz_doc is not None:
+                self._fitz_doc.close()
+                self._fitz_doc = None
+            if self._plumber_doc is not None:
+                self._plumber_doc.close()
+                self._plumber_doc = None
+            self._pypdf_reader = None
+            self._texts.clear()
+            self._fingerprints.clear()
+            self._skipped_pages.clear()
+
+@lru_cache(maxsize=4)
+def worker_document(pdf_path: str, backend: str):
+    """Document opened by a worker process, kept open for the next pages of the same file."""
+    if backend == "fitz":
+        import fitz
+        return fitz.open(pdf_path)
+    if backend == "plumber":
+        import pdfplumber
+        return pdfplumber.open(pdf_path)
+    from PyPDF2 import PdfReader
+    return PdfReader(pdf_path)
+
+def page_text(pdf_path: str, page_index: int, backend: str = "fitz"):
+    """
+    Extract the text layer of one page in a watchdog worker.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        page_index (int): Page to read (0-based index).
+        backend (str, optional): 'fitz' for PyMuPDF or 'pypdf' for PyPDF2. Defaults to 'fitz'.
+
+    Returns:
+        str: Extracted text, empty if the page has no text layer.
+    """
+    document = worker_document(pdf_path, backend)
+    if backend == "fitz":
+        return document.load_page(page_index).get_text() or ""
+    return document.pages[page_index].extract_text() or ""
+
+class PageRange:
+    """
+    In-memory view over a range of pages of a PatentDocument.
+
+    Extractors accept a PageRange wherever they used to take the path of an extracted PDF, so
+    no intermediate file is written. `stem` keeps the name the extracted file used to have,
+    which downstream stages use to name their outputs.
+    """
+    def __init__(self, document: PatentDocument, page_indices, stem: str = None):
+        self.document = document
+        self.pages = tuple(page_indices)
+        self.stem = stem if stem else document.stem
+        self.name = self.stem
+
+    @classmethod
+    def from_range(cls, document: PatentDocument, first_page: int, last_page: int, stem: str = None):
+        """
+        Build a view over pages `first_page` to `last_page` (1-based, inclusive).
+        """
+        return cls(document, range(first_page - 1, last_page), stem)
+
+    def __iter__(self):
+        return iter(self.pages)
+
+    def __len__(self):
+        return len(self.pages)
+
+    def __repr__(self):
+        return f"PageRange({self.stem!r}, pages={[page_index + 1 for page_index in self.pages]})"
+
+    @property
+    def path(self):
+        """Path of the underlying PDF file."""
+        return self.document.path
+
+    @property
+    def first_page(self):
+        """First page of the view (1-based index)."""
+        return self.pages[0] + 1 if self.pages else None
+
+    @property
+    def last_page(self):
+        """Last page of the view (1-based index)."""
+        return self.pages[-1] + 1 if self.pages else None
+
+    def runs(self):
+        """
+        Split the view into runs of consecutive pages, for backends that render page ranges.
+
+        Yields:
+            tuple: (first_page, last_page) of each run (1-based, inclusive).
+        """
+        start = previous = None
+        for page_index in self.pages:
+            if start is None:
+                start = previous = page_index
+            elif page_index == previous + 1:
+                previous = page_index
+            else:
+                yield start + 1, previous + 1
+                start = previous = page_index
+        if start is not None:
+            yield start + 1, previous + 1
+
+    def get_text(self, page_index: int, backend: str = "fitz"):
+        return self.document.get_text(page_index, backend)
+
+    def digest(self):
+        """Content digest of the view, from the fingerprints of its pages in order."""
+        return cache_key("pages", [self.document.fingerprint(page_index) for page_index in self.pages])
+
+    def write(self, output_path):
+        """
+        Serialize the view as a new PDF file, for standalone use and debugging.
+
+        Args:
+            output_path (str or Path): Path of the PDF file to write.
+
+        Returns:
+            str or Path: The output path.
+        """
+        from PyPDF2 import PdfWriter
+        pdf_writer = PdfWriter()
+        for page_index in self.pages:
+            pdf_writer.add_page(self.document.pypdf_page(page_index))
+        with open(output_path, 'wb') as out_file:
+            pdf_writer.write(out_file)
+        return output_path
+
+def as_page_range(pdf):
+    """
+    Return `pdf` as a PageRange: views are returned unchanged, documents and paths are
+    wrapped in a view over all their pages.
+
+    Args:
+        pdf (PageRange or PatentDocument or Path or str): Page view, document handle or PDF path.
+
+    Returns:
+        PageRange: View over the requested pages.
+    """
+    if isinstance(pdf, PageRange):
+        return pdf
+    document = pdf if isinstance(pdf, PatentDocument) else PatentDocument(pdf)
+    return PageRange(document, range(document.page_count))
+
+@contextmanager
+def shared_document(pdf):
+    """
+    Yield a PatentDocument for `pdf`, closing it afterwards only if it was opened here.
+
+    Args:
+        pdf (PatentDocument or Path or str): Shared document handle or path to a PDF file.
+
+    Yields:
+        PatentDocument: Document handle.
+    """
+    if isinstance(pdf, PatentDocument):
+        yield pdf
+        return
+
+    document = PatentDocument(pdf)
+    try:
+        yield document
+    finally:
+        document.close()
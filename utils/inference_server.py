@@ -0,0 +1,170 @@
+import argparse
+import os
+import sys
+import threading
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from multiprocessing.connection import Client, Listener
+from utils.cache import CACHE_DIR
+
+INFERENCE_SOCKET = os.environ.get("INFERENCE_SOCKET", os.path.join(CACHE_DIR, "inference.sock"))  # Unix socket of the inference server
+INFERENCE_AUTHKEY = os.environ.get("INFERENCE_AUTHKEY", "patent-analyzer").encode('utf-8')
+INFERENCE_SERVER = os.environ.get("INFERENCE_SERVER", "1") != "0"  # Whether clients look for a running server
+
+serving = False  # True in the server process, whose tasks must not call back into the server
+
+class ServerUnavailable(Exception):
+    """Raised by `request` when no inference server is running, so that the caller runs the task itself."""
+
+def predict_smiles(images, batch_size: int):
+    """Server task: SMILES of a list of image paths or arrays, in order."""
+    from utils.decimer import predict_batches
+    return list(predict_batches(images, batch_size))
+
+def segment_page(pdf_path, page_index: int, dpi: int):
+    """Server task: segments of one page of a PDF file."""
+    from utils.pdf_to_img import segment_page
+    return segment_page(pdf_path, page_index, dpi)
+
+TASKS = {
+    'predict_smiles': predict_smiles,
+    'segment_page': segment_page,
+}
+
+def load_models():
+    """Load DECIMER, which loads its models on import, and the segmentation model."""
+    from utils.tf_config import configure_tensorflow
+    configure_tensorflow()
+    import DECIMER  # noqa: F401
+    from decimer_segmentation import decimer_segmentation
+
+    # Recent decimer_segmentation versions load the Mask R-CNN model on first use
+    if hasattr(decimer_segmentation, 'get_model'):
+        decimer_segmentation.get_model()
+
+def handle(connection, lock: threading.Lock, stop: threading.Event):
+    """Answer the requests of one client: ('ping',), ('stop',) or (task name, *args)."""
+    with connection:
+        while True:
+            try:
+                request = connection.recv()
+            except (EOFError, OSError):
+                return
+            name, args = request[0], request[1:]
+            if name == 'ping':
+                connection.send((True, 'pong'))
+            elif name == 'stop':
+                connection.send((True, None))
+                stop.set()
+                return
+            elif name not in TASKS:
+                connection.send((False, f"Unknown task: {name}"))
+            else:
+                try:
+                    # One task at a time on the models, TensorFlow threads already use every core
+                    with lock:
+                        result = (True, TASKS[name](*args))
+                except Exception as e:
+                    result = (False, f"{type(e).__name__}: {e}")
+                connection.send(result)
+
+def serve(address: str = INFERENCE_SOCKET, authkey: bytes = INFERENCE_AUTHKEY):
+    """
+    Load the models once and answer prediction and segmentation requests on a Unix socket
+    until a 'stop' request is received.
+
+    Args:
+        address (str, optional): Path of the Unix socket. Defaults to the INFERENCE_SOCKET environment variable.
+        authkey (bytes, optional): Key shared with the clients. Defaults to the INFERENCE_AUTHKEY environment variable.
+    """
+    global serving
+    serving = True
+    load_models()
+    os.makedirs(os.path.dirname(address) or ".", exist_ok=True)
+    if os.path.exists(address):
+        os.remove(address)  # Left by a server that did not shut down cleanly
+
+    lock = threading.Lock()
+    stop = threading.Event()
+    listener = Listener(address, family='AF_UNIX', authkey=authkey)
+    print(f"Inference server ready on {address}.")
+
+    def accept():
+        while not stop.is_set():
+            try:
+                connection = listener.accept()
+            except Exception:
+                continue
+            threading.Thread(target=handle, args=(connection, lock, stop), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    try:
+        stop.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        if os.path.exists(address):
+            os.remove(address)
+        print("Inference server stopped.")
+
+def request(name: str, *args, timeout: float = None, address: str = INFERENCE_SOCKET):
+    """
+    Run a task on the inference server.
+
+    Args:
+        name (str): Task name, see TASKS.
+        *args: Task arguments, picklable.
+        timeout (float, optional): Seconds to wait for the result. Defaults to no limit.
+        address (str, optional): Path of the Unix socket. Defaults to the INFERENCE_SOCKET environment variable.
+
+    Returns:
+        The result of the task.
+
+    Raises:
+        ServerUnavailable: If no server is running.
+        TimeoutError: If the server did not answer within `timeout`.
+        RuntimeError: If the task raised, with the message of the exception.
+    """
+    if serving or not INFERENCE_SERVER or not os.path.exists(address):
+        raise ServerUnavailable(address)
+    try:
+        connection = Client(address, family='AF_UNIX', authkey=INFERENCE_AUTHKEY)
+    except (OSError, EOFError) as e:
+        raise ServerUnavailable(f"{address}: {e}")
+
+    with connection:
+        try:
+            connection.send((name, *args))
+            answered = connection.poll(timeout) if timeout else True
+            if answered:
+                ok, value = connection.recv()
+        except (OSError, EOFError) as e:
+            raise ServerUnavailable(f"{address}: {e}")
+    if not answered:
+        raise TimeoutError(f"no answer from the inference server within {timeout:g} s")
+    if not ok:
+        raise RuntimeError(value)
+    return value
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep the DECIMER and segmentation models loaded and serve them to the pipelines over a Unix socket.")
+    parser.add_argument("-s", "--socket", default=INFERENCE_SOCKET, help=f"Path of the Unix socket. Default = {INFERENCE_SOCKET}")
+    parser.add_argument("--stop", action="store_true", help="Stop the server running on the socket.")
+    parser.add_argument("--ping", action="store_true", help="Check whether a server is running on the socket.")
+    args = parser.parse_args()
+
+    if args.stop or args.ping:
+        try:
+            request('stop' if args.stop else 'ping', address=args.socket)
+            print("Server stopped." if args.stop else "Server running.")
+        except ServerUnavailable:
+            print(f"No server running on {args.socket}.")
+        return
+
+    serve(args.socket)
+
+if __name__ == "__main__":
+    # Run the server from the module the tasks import, so that they see `serving` set
+    from utils import inference_server
+    inference_server.main()
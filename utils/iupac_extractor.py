@@ -1,67 +1,115 @@
 import csv
 import os
+import shutil
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from pathlib import Path
-from utils.converter import pdf_to_excel, excel_to_csv, csv_to_txt
-from utils.preprocessor import preprocess_csv_text, preprocess_text, merge_text_files
+from utils.converter import EXPORT_TABLES_XLSX, csv_to_txt, extract_tables, table_rows, tables_to_excel
+from utils.document import as_page_range
+from utils.name_filter import NAME_PREFILTER
+from utils.preprocessor import preprocess_table_rows, preprocess_text, merge_text_files
 from utils.puller import extract_text_from_pdf, extract_molecules_from_text
+from utils.stages import Stage, run_stages
+from utils.triage import TABLE, TEXT, select_pages
 
-def pdf_molecules_extractor(pdf_file: Path, output_folder: Path):
+def write_text(pages, txt_file: Path):
+    """
+    Extract the text of the pages triaged as text, or scans, into a text file.
+
+    Args:
+        pages (PageRange): Page view to read.
+        txt_file (Path): Path of the output text file.
+    """
+    extracted = extract_text_from_pdf(select_pages(pages, TEXT), Path(txt_file).parent)
+    if Path(extracted) != Path(txt_file):
+        os.replace(extracted, txt_file)
+
+def write_table_names(pages, txt_file: Path):
+    """
+    Extract the example and compound name columns of the tables of the pages triaged as tables
+    into a text file, left empty if no table is found.
+
+    Args:
+        pages (PageRange): Page view to read.
+        txt_file (Path): Path of the output text file.
+    """
+    # Extract tables from PDF in memory, and export them to Excel only for debugging
+    tables_extracted, tables = extract_tables(select_pages(pages, TABLE))
+    if EXPORT_TABLES_XLSX:
+        tables_to_excel(tables, Path(txt_file).parent / f'{pages.stem}_tables.xlsx')
+
+    if tables_extracted:
+        csv_to_txt(preprocess_table_rows(table_rows(tables)), txt_file)
+    else:
+        open(txt_file, 'w', encoding='utf-8').close()
+
+def combine_texts(table_names_file: Path, text_file: Path, combined_txt_file: Path):
+    """
+    Put the preprocessed table names, if any, before the preprocessed text.
+
+    Args:
+        table_names_file (Path): Path to the preprocessed table names.
+        text_file (Path): Path to the preprocessed text.
+        combined_txt_file (Path): Path of the combined text file.
+    """
+    if os.path.getsize(table_names_file):
+        merge_text_files(table_names_file, text_file, combined_txt_file)
+    else:
+        shutil.copyfile(text_file, combined_txt_file)
+
+def write_molecules(txt_file: Path, output_file: Path, prefilter: bool = NAME_PREFILTER):
+    """
+    Extract the molecules of a preprocessed text into a CSV file, see save_to_csv.
+
+    Args:
+        txt_file (Path): Path to the preprocessed text.
+        output_file (Path): Path of the output CSV file.
+        prefilter (bool, optional): See extract_molecules_from_text.
+    """
+    save_to_csv(extract_molecules_from_text(txt_file, prefilter=prefilter, preprocess=False), output_file)
+
+# Stages from a page view ('pages') to the CSV of its molecules ('molecules'). Each artifact is
+# computed once per run, and reused across runs while the stage inputs do not change.
+MOLECULE_STAGES = [
+    Stage('extract_text', write_text, ['pages'], {'text': '{base}.txt'}),
+    Stage('extract_table_names', write_table_names, ['pages'], {'table_names': '{base}_csv.txt'}),
+    Stage('preprocess_text', preprocess_text, ['text'], {'preprocessed_text': '{base}_preprocessed.txt'}, params={'streaming': True}),
+    Stage('preprocess_table_names', preprocess_text, ['table_names'], {'preprocessed_table_names': '{base}_csv_preprocessed.txt'}, params={'streaming': True}),
+    Stage('combine_texts', combine_texts, ['preprocessed_table_names', 'preprocessed_text'], {'combined_text': '{base}_combined.txt'}),
+    Stage('extract_molecules', write_molecules, ['combined_text'], {'molecules': '{base}_iupac.csv'}, params={'prefilter': NAME_PREFILTER}),
+]
+
+def has_rows(csv_file):
+    """Check whether a CSV file has rows besides its header."""
+    with open(csv_file, 'r', encoding='utf-8') as f:
+        return sum(1 for line in f if line.strip()) > 1
+
+def pdf_molecules_extractor(pdf_file, output_folder: Path):
     """
     Extract molecules from a PDF and save them in a CSV file.
 
     Args:
-        pdf_file (Path): Path to the input PDF file.
+        pdf_file (PageRange or Path): Page view or path to the input PDF file.
         output_folder (Path): Path to the output folder.
 
     Returns:
         str: Path to the output CSV file containing extracted molecules.
 
     """
-    # Ensure pdf_file and output_folder are Path objects
-    pdf_file = Path(pdf_file)
+    # Ensure pdf_file is a page view and output_folder is a Path object
+    pdf_file = as_page_range(pdf_file)
     output_folder = Path(output_folder)
 
-    # Generate filenames based on the PDF file name
-    base_name = pdf_file.stem  # Use .stem to get the filename without extension
-    txt_file = output_folder / f'{base_name}.txt'
-    excel_file = output_folder / f'{base_name}_tables.xlsx'
-    csv_file = output_folder / f'{base_name}_tables.csv'
-    csv_txt_file = output_folder / f'{base_name}_csv.txt'
-    combined_txt_file = output_folder / f'{base_name}_combined.txt'
+    # Run the stages, reusing the artifacts of previous runs on the same pages
+    artifacts = run_stages(MOLECULE_STAGES, {'pages': (pdf_file, pdf_file.digest())}, output_folder, pdf_file.stem)
+    output_file = artifacts['molecules']
 
-    # Extract tables from PDF and convert to CSV
-    tables_extracted = pdf_to_excel(pdf_file, excel_file)
-    
-    if tables_extracted:
-        # Extract text from PDF and preprocess CSV and text files
-        txt_file = extract_text_from_pdf(pdf_file, output_folder)
-        excel_to_csv(excel_file, csv_file)
-        csv_txt = preprocess_csv_text(csv_file)
-        csv_to_txt(csv_txt, csv_txt_file)
-        
-        # Preprocess and merge text files, then extract molecules
-        preprocessed_txt_path = output_folder / f'{base_name}_preprocessed.txt'
-        preprocess_text(txt_file, preprocessed_txt_path)
-        merge_text_files(csv_txt_file, preprocessed_txt_path, combined_txt_file)
-        molecules = extract_molecules_from_text(combined_txt_file)
-    else:        
-        # If no tables extracted, directly preprocess text and extract molecules
-        txt_file = extract_text_from_pdf(pdf_file, output_folder)
-        preprocessed_txt_path = output_folder / f'{base_name}_preprocessed.txt'
-        preprocess_text(txt_file, preprocessed_txt_path)
-        molecules = extract_molecules_from_text(preprocessed_txt_path)
-        
     # If no molecules found, print a message and return
-    if not molecules:
+    if not has_rows(output_file):
         print("No molecule found.")
         return
-    
-    # Save extracted molecules to a CSV file
-    output_file = output_folder / f'{base_name}_iupac.csv'
-    save_to_csv(molecules, output_file)
+
     print(f"The results have been saved in {output_file}")
 
     return output_file
@@ -106,4 +154,4 @@ if __name__ == "__main__":
         print(f"The following file does not exist: {pdf_file}.")
         sys.exit(1)
 
-    pdf_molecules_extractor(Path(pdf_file))
\ No newline at end of file
+    pdf_molecules_extractor(Path(pdf_file), Path(pdf_file).parent)
\ No newline at end of file
@@ -1,25 +1,269 @@
+import atexit
 import logging
 import os
 import pandas as pd
-import requests
+import sys
+import threading
+import unicodedata
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from utils.cache import MISSING, cache_key, get_cache
+from utils.chemdata import batches
+from utils.run_report import run_report
+from utils.watchdog import worker_context
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def convert_IUPAC_to_SMILES(iupac_name: str):
+OPSIN_BACKENDS = ('auto', 'local', 'http')
+OPSIN_BACKEND = os.environ.get("OPSIN_BACKEND", "auto")  # 'local' for the OPSIN jar in a JVM, 'http' for the web service, 'auto' for local when OPSIN_JAR is set
+OPSIN_JAR = os.environ.get("OPSIN_JAR", "")  # Path of the OPSIN jar with its dependencies, e.g. opsin-cli-2.8.0-jar-with-dependencies.jar
+OPSIN_URL = os.environ.get("OPSIN_URL", "https://opsin.ch.cam.ac.uk/opsin")
+OPSIN_WORKERS = int(os.environ.get("OPSIN_WORKERS", "1"))  # Processes converting names, each with its own JVM
+OPSIN_BATCH_SIZE = int(os.environ.get("OPSIN_BATCH_SIZE", "256"))  # Names sent to a worker at once
+IUPAC_LRU_SIZE = int(os.environ.get("IUPAC_LRU_SIZE", "100000"))  # Conversions kept in memory in front of the SQLite store
+
+def normalize_name(name: str):
     """
-    Convert an IUPAC name to SMILES notation using the OPSIN web service.
+    Cache key form of an IUPAC name: Unicode NFKC (e.g. full-width or ligature characters),
+    surrounding whitespace stripped and inner whitespace collapsed. Case is kept, since it is
+    significant in names (e.g. stereodescriptors, element symbols).
+    """
+    return " ".join(unicodedata.normalize('NFKC', name).split())
+
+def opsin_version(backend: str):
+    """
+    OPSIN that converts names with a backend ('local' or 'http'), part of the cache keys: the jar
+    file name, which carries its version, or the URL of the web service, whose version is unknown.
+    """
+    return f"local:{os.path.basename(OPSIN_JAR)}" if backend == 'local' else f"http:{OPSIN_URL}"
+
+class SmilesCache:
+    """
+    Two-level cache of the SMILES converted from normalized IUPAC names by an OPSIN version (see
+    opsin_version): a bounded in-process LRU in front of a persistent SQLite store (see
+    utils/cache.py). Names OPSIN could not parse are stored as None, so that they are not
+    converted again on the next run. Hits of each level and misses are counted in the run report.
+    """
+    def __init__(self, disk, size: int = IUPAC_LRU_SIZE):
+        self.disk = disk
+        self.size = max(0, size)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, key: tuple, smiles):
+        if not self.size:
+            return
+        with self._lock:
+            self._memory[key] = smiles
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.size:
+                self._memory.popitem(last=False)
+
+    def get(self, name: str, version: str):
+        """
+        Look up a normalized name.
+
+        Args:
+            name (str): Normalized IUPAC name.
+            version (str): OPSIN that converts the name, see opsin_version.
+
+        Returns:
+            str or None: The stored SMILES, None for a name OPSIN could not parse, or MISSING if the name is not stored.
+        """
+        with self._lock:
+            if (version, name) in self._memory:
+                self._memory.move_to_end((version, name))
+                run_report.count("iupac_cache_memory_hits")
+                return self._memory[(version, name)]
+        smiles = self.disk.get(cache_key("iupac_smiles", version, name)) if self.disk is not None else MISSING
+        if smiles is MISSING:
+            run_report.count("iupac_cache_misses")
+            return MISSING
+        run_report.count("iupac_cache_disk_hits")
+        self._remember((version, name), smiles)
+        return smiles
+
+    def put(self, name: str, version: str, smiles):
+        """Store the SMILES of a normalized name, None if OPSIN could not parse it."""
+        self._remember((version, name), smiles)
+        if self.disk is not None:
+            self.disk.put(cache_key("iupac_smiles", version, name), smiles)
+
+_smiles_cache = None
+_smiles_cache_lock = threading.Lock()
+
+def get_smiles_cache():
+    """Get the process-wide name cache, stored on disk as `<CACHE_DIR>/iupac.sqlite` unless PATENT_CACHE=0."""
+    global _smiles_cache
+    with _smiles_cache_lock:
+        if _smiles_cache is None:
+            _smiles_cache = SmilesCache(get_cache("iupac"))
+        return _smiles_cache
+
+class OpsinGateway:
+    """
+    OPSIN running in a JVM started through a py4j gateway. The JVM is started once and serves
+    every name converted by the process; it exits with the process.
+    """
+    def __init__(self, jar: str = OPSIN_JAR):
+        from py4j.java_gateway import GatewayParameters, JavaGateway, launch_gateway
+
+        if not jar or not os.path.exists(jar):
+            raise FileNotFoundError(f"OPSIN jar not found: {jar!r}, set OPSIN_JAR")
+        port = launch_gateway(classpath=jar, die_on_exit=True)
+        self.gateway = JavaGateway(gateway_parameters=GatewayParameters(port=port, auto_convert=True))
+        self.name_to_structure = self.gateway.jvm.uk.ac.cam.ch.wwmm.opsin.NameToStructure.getInstance()
+
+    def parse(self, names):
+        """SMILES of each name, None for the names OPSIN cannot parse."""
+        return [self.name_to_structure.parseToSmiles(name) if isinstance(name, str) else None for name in names]
+
+    def close(self):
+        self.gateway.shutdown()
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+def get_gateway():
+    """Get the OPSIN gateway of this process, starting its JVM on first use."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = OpsinGateway()
+        return _gateway
+
+def start_worker_gateway():
+    """Pool initializer: start the worker's own JVM before its first batch."""
+    global _gateway
+    _gateway = OpsinGateway()
+
+@atexit.register
+def close_gateway():
+    with _gateway_lock:
+        if _gateway is not None:
+            _gateway.close()
+
+def resolve_backend(backend: str = None):
+    """
+    Backend used for a conversion: 'auto' resolves to 'local' when OPSIN_JAR is set and py4j is
+    installed, and to 'http' otherwise.
+    """
+    backend = (backend if backend else OPSIN_BACKEND).lower()
+    if backend not in OPSIN_BACKENDS:
+        raise ValueError(f"OPSIN backend must be one of {', '.join(OPSIN_BACKENDS)}, not {backend!r}")
+    if backend == 'auto':
+        try:
+            import py4j  # noqa: F401
+            backend = 'local' if OPSIN_JAR else 'http'
+        except ImportError:
+            backend = 'http'
+    return backend
+
+def local_batch(names):
+    """Convert a batch of names with the local OPSIN of this process, e.g. in a pool worker."""
+    smiles = get_gateway().parse(names)
+    for name, result in zip(names, smiles):
+        if not result:
+            logger.warning(f"OPSIN could not convert IUPAC name '{name}' to SMILES notation.")
+    return [result if result else None for result in smiles]
+
+def opsin_smiles(names, backend: str = None, workers: int = None, batch_size: int = OPSIN_BATCH_SIZE):
+    """
+    Convert IUPAC names to SMILES in bulk with an OPSIN backend, without the cache.
+
+    With the local backend, names are converted by OPSIN in a long-lived JVM, in batches spread
+    over `workers` processes that each start their own JVM once. With the HTTP backend, each name
+    is sent to the OPSIN web service. When the backend is 'auto' and the local OPSIN cannot be
+    started, the web service is used instead.
 
     Args:
-        iupac_name (str): IUPAC name of the molecule to convert.
+        names (list): IUPAC names.
+        backend (str, optional): 'auto', 'local' or 'http'. Defaults to the OPSIN_BACKEND environment variable, or 'auto'.
+        workers (int, optional): Number of conversion processes of the local backend. Defaults to the OPSIN_WORKERS environment variable, or 1.
+        batch_size (int, optional): Names per batch of the local backend. Defaults to OPSIN_BATCH_SIZE.
 
     Returns:
-        str or None: SMILES notation if conversion successful, None otherwise.
+        tuple: (backend, smiles) with the backend that converted the names, 'local' or 'http', and
+        the SMILES of each name, None where OPSIN could not parse the name, MISSING where the web
+        service gave no answer.
+    """
+    names = list(names)
+    requested = (backend if backend else OPSIN_BACKEND).lower()
+    workers = workers if workers else OPSIN_WORKERS
+    if names and resolve_backend(backend) == 'local':
+        try:
+            if workers <= 1 or len(names) <= batch_size:
+                return 'local', local_batch(names)
+            # Workers come from a fork server, so they inherit neither the parent's gateway nor its locks
+            with ProcessPoolExecutor(max_workers=workers, initializer=start_worker_gateway, mp_context=worker_context()) as executor:
+                return 'local', [smiles for batch in executor.map(local_batch, batches(names, max(1, batch_size))) for smiles in batch]
+        except Exception as e:
+            if requested == 'local':
+                raise
+            logger.error(f"Local OPSIN unavailable ({e}), using the OPSIN web service.")
+
+    return 'http', [http_smiles(name) for name in names]
+
+def convert_names(names, backend: str = None, workers: int = None, batch_size: int = OPSIN_BATCH_SIZE):
+    """
+    Convert IUPAC names to SMILES in bulk, see opsin_smiles. Names are normalized and deduplicated
+    first, then looked up in the name cache, and only the names it does not know are converted.
+    Conversions are stored in the cache under the OPSIN version that made them, names OPSIN could
+    not parse included, except when the web service gave no answer.
+
+    Args:
+        names (list): IUPAC names, e.g. a DataFrame column; values that are not strings give None.
+        backend (str, optional): 'auto', 'local' or 'http'. Defaults to the OPSIN_BACKEND environment variable, or 'auto'.
+        workers (int, optional): Number of conversion processes of the local backend. Defaults to the OPSIN_WORKERS environment variable, or 1.
+        batch_size (int, optional): Names per batch of the local backend. Defaults to OPSIN_BATCH_SIZE.
+
+    Returns:
+        list: SMILES of each name, None where the conversion failed.
     """
+    keys = [normalize_name(name) if isinstance(name, str) else "" for name in names]
+    unique = list(dict.fromkeys(key for key in keys if key))
+    run_report.count("iupac_duplicate_names", sum(1 for key in keys if key) - len(unique))
+
+    cache = get_smiles_cache()
+    version = opsin_version(resolve_backend(backend))
+    known = {}
+    for key in unique:
+        smiles = cache.get(key, version)
+        if smiles is not MISSING:
+            known[key] = smiles
+
+    missing = [key for key in unique if key not in known]
+    # The backend that converted the names may differ from the resolved one after a fallback
+    used, converted = opsin_smiles(missing, backend, workers, batch_size)
+    for key, smiles in zip(missing, converted):
+        if smiles is not MISSING:
+            cache.put(key, opsin_version(used), smiles)
+            known[key] = smiles
+
+    return [known.get(key) for key in keys]
+
+def http_smiles(iupac_name: str):
+    """
+    Convert an IUPAC name with the OPSIN web service.
+
+    Returns:
+        str or None: SMILES notation, None if OPSIN could not parse the name, or MISSING if the
+        service could not be reached or gave an unexpected answer.
+    """
+    import requests
+
     try:      
         # Send a GET request to OPSIN web service
-        response = requests.get(f"https://opsin.ch.cam.ac.uk/opsin/{iupac_name}.json")
+        response = requests.get(f"{OPSIN_URL}/{iupac_name}.json")
         
+        # OPSIN answers 404 for names it cannot parse
+        if response.status_code == 404:
+            logger.warning(f"OPSIN could not convert IUPAC name '{iupac_name}' to SMILES notation.")
+            return None
+
         # Raise an exception for HTTP errors (non-2xx status codes)
         response.raise_for_status()
         
@@ -37,40 +281,63 @@ def convert_IUPAC_to_SMILES(iupac_name: str):
     except Exception as e:
         # Log error if conversion fails
         logger.error(f"Error converting IUPAC name '{iupac_name}' using OPSIN: {e}")
-        return None
+        return MISSING
 
-def from_iupac_to_smiles_conversion(file_path, column_name):
+def convert_IUPAC_to_SMILES(iupac_name: str):
+    """
+    Convert an IUPAC name to SMILES notation using the OPSIN web service.
+
+    Args:
+        iupac_name (str): IUPAC name of the molecule to convert.
+
+    Returns:
+        str or None: SMILES notation if conversion successful, None otherwise.
+    """
+    smiles = http_smiles(iupac_name)
+    return None if smiles is MISSING else smiles
+
+def from_iupac_to_smiles_conversion(file_path, column_name, output_file=None, backend: str = None, workers: int = None):
     """
     Convert IUPAC names in a CSV file to SMILES notation and save the results in a new CSV file.
 
     Args:
         file_path (str): Path to the input CSV file containing molecule names.
         column_name (str): Name of the column in the CSV file containing molecule names.
+        output_file (str, optional): Path of the output CSV file. Defaults to the input path with a '_smiles.csv' suffix.
+        backend (str, optional): OPSIN backend, see convert_names. Defaults to the OPSIN_BACKEND environment variable, or 'auto'.
+        workers (int, optional): Number of conversion processes of the local backend. Defaults to the OPSIN_WORKERS environment variable, or 1.
+
+    Returns:
+        str: Path to the output CSV file.
     """
     
     # Load CSV file into a pandas DataFrame
     df = pd.read_csv(file_path)
     
-    # Apply convert_to_smiles_with_opsin function to each IUPAC name in the specified column
-    df['SMILES'] = df[column_name].apply(convert_IUPAC_to_SMILES)
+    # Convert the IUPAC names of the specified column in bulk, each distinct name once
+    df['SMILES'] = convert_names(df[column_name].tolist(), backend, workers)
     
     # Drop rows where SMILES could not be generated
     df = df.dropna(subset=['SMILES'])
     
     # Determine output file name based on input file name
     base_name = os.path.splitext(file_path)[0]
-    output_file_name = base_name + '_smiles.csv'
+    output_file_name = output_file if output_file else base_name + '_smiles.csv'
     
     # Save results to a new CSV file
     df.to_csv(output_file_name, index=False)
     
     logger.info(f"Molecule names converted to SMILES and saved to {output_file_name}")
 
+    return output_file_name
+
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Convert IUPAC names to SMILES notation.")
     parser.add_argument("-f", "--file_path", required=True, help="Path to the CSV file containing molecule names")    
     parser.add_argument("-c", "--column_name", required=True, help="Name of the column containing molecule names")
+    parser.add_argument("-b", "--backend", choices=OPSIN_BACKENDS, default=OPSIN_BACKEND, help=f"OPSIN backend: the jar in a local JVM or the web service. Default = {OPSIN_BACKEND}")
+    parser.add_argument("-w", "--workers", type=int, default=OPSIN_WORKERS, help=f"Conversion processes of the local backend, each with its own JVM. Default = {OPSIN_WORKERS}")
     args = parser.parse_args()
 
-    from_iupac_to_smiles_conversion(args.file_path, args.column_name)
\ No newline at end of file
+    from_iupac_to_smiles_conversion(args.file_path, args.column_name, backend=args.backend, workers=args.workers)
\ No newline at end of file
@@ -0,0 +1,80 @@
+import os
+import re
+
+NAME_PREFILTER = os.environ.get("NAME_PREFILTER", "0") == "1"  # Set NAME_PREFILTER=1 to only send paragraphs with a likely systematic name to ChemDataExtractor
+MIN_NAME_SCORE = 2  # Score a word needs to be considered a systematic name
+
+# Locants and stereodescriptors followed by a hyphen: '2-', '1,3-', "4'-", 'N-', 'N,N-', '(S)-', '1H-'
+LOCANT_PATTERN = re.compile(r"(?:^|[\s(\[{,-])(?:\d+[a-z]?'*(?:,\d+[a-z]?'*)*[HR]?|[NOSPRZE](?:,[NOSPRZE])*|\(\d*[RSEZ]\))-")
+# Parent chains, rings and substituent stems
+NAME_STEMS = re.compile(
+    r'meth|eth|prop|but|pent|hex|hept|oct|non|dec|phen|benz|naphth|pyr|pyrid|pyrimid|pyraz|imidaz|'
+    r'triaz|tetraz|thiaz|oxaz|oxadiaz|isoxaz|furan|thiophen|indol|indaz|quinol|quinazol|isoquinol|'
+    r'piperid|piperaz|morpholin|azetid|pyrrol|cyclo|spiro|bicyclo|carb|sulf|fluor|chlor|brom|iod|'
+    r'hydr|amin|amid|acet|oxo|hydroxy|nitro|cyano|trifluoro|methoxy|ethoxy',
+    re.IGNORECASE,
+)
+# Suffixes ending a name or one of its parts
+NAME_SUFFIXES = re.compile(
+    r'(?:yl|ylene|ylidene|ane|ene|yne|ol|one|al|amide|amine|imine|ine|ile|oic|ate|ide|oxy|ium|'
+    r'carboxylic|sulfonic|acid)(?=$|[-)\]}.,])',
+    re.IGNORECASE,
+)
+
+def bracket_balance(word):
+    """
+    Check that the brackets of a word are balanced and properly nested.
+
+    Args:
+        word (str): Word to check.
+
+    Returns:
+        bool: True if the word has brackets and they are balanced.
+    """
+    closing = {')': '(', ']': '[', '}': '{'}
+    stack = []
+    for char in word:
+        if char in '([{':
+            stack.append(char)
+        elif char in closing:
+            if not stack or stack.pop() != closing[char]:
+                return False
+    return not stack and any(char in closing for char in word)
+
+def name_score(word):
+    """
+    Score how much a word looks like a systematic (IUPAC) name: locants, chain and ring stems,
+    name suffixes and balanced brackets each add to the score.
+
+    Args:
+        word (str): Whitespace-free word.
+
+    Returns:
+        int: Score, 0 for words without any name morphology.
+    """
+    if len(word) < 4:
+        return 0
+    score = 0
+    if LOCANT_PATTERN.search(word):
+        score += 2
+    if NAME_STEMS.search(word):
+        score += 1
+    if NAME_SUFFIXES.search(word):
+        score += 1
+    if bracket_balance(word):
+        score += 1
+    return score
+
+def is_name_candidate(paragraph, min_score: int = MIN_NAME_SCORE):
+    """
+    Check whether a paragraph may contain a systematic name, i.e. is worth parsing with
+    ChemDataExtractor.
+
+    Args:
+        paragraph (str): Paragraph to check.
+        min_score (int, optional): Score one of its words must reach. Defaults to MIN_NAME_SCORE.
+
+    Returns:
+        bool: True if a word of the paragraph reaches `min_score`.
+    """
+    return any(name_score(word) >= min_score for word in paragraph.split())
@@ -0,0 +1,124 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from utils.cache import MISSING, cache_key, get_cache
+from utils.document import PatentDocument
+from utils.rasterizer import RASTER_DPI, iter_page_images
+from utils.watchdog import PageSkipped, run_pages, watchdog_enabled, worker_context
+
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", "1"))  # Default size of the OCR process pool
+OCR_DPI = int(os.environ.get("OCR_DPI", RASTER_DPI))  # Same default as SEGMENTATION_DPI, so that a page is rendered once for both
+
+@lru_cache(maxsize=None)
+def tesseract_version():
+    import pytesseract
+    return str(pytesseract.get_tesseract_version())
+
+def ocr_page(pdf_path, page_index: int, dpi: int = OCR_DPI, lang: str = 'eng'):
+    """
+    Render one page of a PDF file and read it with Tesseract OCR.
+
+    Args:
+        pdf_path (str or Path): Path to the PDF file.
+        page_index (int): Page to read (0-based index).
+        dpi (int, optional): Rendering resolution. Defaults to OCR_DPI.
+        lang (str, optional): Tesseract language. Defaults to 'eng'.
+
+    Returns:
+        str: OCR text of the page.
+    """
+    import pytesseract
+
+    return "".join(pytesseract.image_to_string(image, lang=lang) for _, image in iter_page_images(pdf_path, [page_index], dpi))
+
+def ocr_image(image, lang: str = 'eng'):
+    """Read a rendered page with Tesseract OCR, e.g. in a pool worker."""
+    import pytesseract
+
+    return pytesseract.image_to_string(image, lang=lang)
+
+def ocr_pages(pdf, page_indices, workers: int = None, dpi: int = OCR_DPI, lang: str = 'eng'):
+    """
+    OCR a set of pages, in a process pool when more than one worker is requested.
+
+    When a PatentDocument is given, results are kept in the on-disk cache, keyed by the page
+    fingerprint, the Tesseract version and the OCR settings, and cached pages are not rendered.
+
+    Pages are rendered in this process, through the raster cache the other stages of the process
+    read too (see utils/rasterizer.py), and pool workers only receive the rasters. Unless the 'ocr'
+    stage has no time budget, each page is instead rendered and read in a watchdog worker, and a
+    page that goes over the budget is left empty and not cached.
+
+    Args:
+        pdf (PatentDocument or str or Path): Shared document handle or path to the PDF file.
+        page_indices (list): Pages to read (0-based indices).
+        workers (int, optional): Number of OCR processes. Defaults to the OCR_WORKERS environment variable, or 1.
+        dpi (int, optional): Rendering resolution. Defaults to OCR_DPI.
+        lang (str, optional): Tesseract language. Defaults to 'eng'.
+
+    Returns:
+        dict: OCR text for each page index.
+    """
+    import pytesseract
+
+    page_indices = list(page_indices)
+    workers = workers if workers else OCR_WORKERS
+    pdf_path = pdf.path if isinstance(pdf, PatentDocument) else pdf
+
+    # Look up pages already read in a previous run
+    texts = {}
+    keys = {}
+    cache = get_cache() if isinstance(pdf, PatentDocument) else None
+    if cache is not None:
+        for page_index in page_indices:
+            keys[page_index] = cache_key("ocr", tesseract_version(), dpi, lang, pdf.fingerprint(page_index))
+            text = cache.get(keys[page_index])
+            if text is not MISSING:
+                texts[page_index] = text
+    missing = [page_index for page_index in page_indices if page_index not in texts]
+    skipped = set()
+
+    if watchdog_enabled("ocr"):
+        document_name = os.path.basename(pdf_path)
+        page_args = {page_index: (str(pdf_path), page_index, dpi, lang) for page_index in missing}
+        for page_index, text in run_pages("ocr", ocr_page, page_args, document_name, workers).items():
+            if isinstance(text, PageSkipped):
+                skipped.add(page_index)
+                if isinstance(pdf, PatentDocument):
+                    pdf.skip_page(page_index)
+                text = ""
+            elif isinstance(text, Exception):
+                raise text
+            texts[page_index] = text
+    elif workers <= 1 or len(missing) <= 1:
+        # Stream the rasters: each page is read as soon as it is rendered, then released
+        for page_index in missing:
+            texts[page_index] = ""
+        for page_index, image in iter_page_images(pdf_path, missing, dpi):
+            texts[page_index] += pytesseract.image_to_string(image, lang=lang)
+    else:
+        # Render here, so that a page segmented in this process is rendered once for both stages,
+        # and keep at most one raster per worker waiting. Workers come from a fork server: a forked
+        # child could inherit a lock held by another thread, e.g. the raster cache's
+        workers = min(workers, len(missing))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=worker_context()) as executor:
+            pending = deque()
+            for page_index, image in iter_page_images(pdf_path, missing, dpi):
+                pending.append((page_index, executor.submit(ocr_image, image, lang)))
+                if len(pending) >= workers:
+                    page_index, future = pending.popleft()
+                    texts[page_index] = future.result()
+            while pending:
+                page_index, future = pending.popleft()
+                texts[page_index] = future.result()
+
+    if cache is not None:
+        for page_index in missing:
+            if page_index not in skipped:
+                cache.put(keys[page_index], texts[page_index])
+
+    return {page_index: texts[page_index] for page_index in page_indices}
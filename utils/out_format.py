@@ -1,8 +1,6 @@
 import os
 import pandas as pd
 
-from rdkit.Chem import PandasTools
-
 def sdf_output_format(input_file: str):
     """
     Convert a CSV file to an SDF file format using RDKit.
@@ -10,6 +8,8 @@ def sdf_output_format(input_file: str):
     Args:
         input_file (str): Path to the input CSV file.
     """
+    from rdkit.Chem import PandasTools
+
     # Extract base name from input file path
     base_name = os.path.splitext(os.path.basename(input_file))[0]
     
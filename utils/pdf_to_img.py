@@ -1,46 +1,255 @@
-import glob
 import numpy as np
 import os
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 import sys
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
-from decimer_segmentation import segment_chemical_structures_from_file, save_images, get_bnw_image
-
-def chemical_structure_segmentation(input_path):
-    """
-    This script segments chemical structures in a document, saves the original
-    segmented images as well as a binarized image and a an undistorted square
-    image
-    """
-    # Extract chemical structure depictions and save them
-    raw_segments = segment_chemical_structures_from_file(input_path)
-    folder_name = os.path.splitext(input_path)[0]  # Remove file extension
-    segment_dir = os.path.join(folder_name, "segments")
-    save_images(
-        raw_segments, segment_dir, f"{os.path.split(input_path)[1][:-4]}_orig"
-    )
-    # Get binarized segment images
-    binarized_segments = [get_bnw_image(segment) for segment in raw_segments]
-    save_images(
-        binarized_segments, segment_dir, f"{os.path.split(input_path)[1][:-4]}_bnw"
-    )
-    # Get segments in size 400*400 and save them
-    normalized_segments = [
-        get_square_image(segment, 400) for segment in raw_segments
+from utils.document import PageRange, as_page_range, shared_document
+from utils.inference_server import ServerUnavailable, request
+from utils.rasterizer import RASTER_DPI, iter_page_images, raster_budget
+from utils.run_report import run_report
+from utils.tf_config import configure_tensorflow
+from utils.watchdog import PageSkipped, get_pool, stage_budget, watchdog_enabled
+
+SEGMENTATION_DPI = int(os.environ.get("SEGMENTATION_DPI", RASTER_DPI))  # decimer_segmentation renders PDF files at 300 DPI
+SEGMENT_SIZE = 400  # Side of the square images the segments are normalized to
+SEGMENTATION_WORKERS = int(os.environ.get("SEGMENTATION_WORKERS", max(1, (os.cpu_count() or 1) // 4)))  # Pages segmented at once, each worker holds a Mask R-CNN model
+SAVE_SEGMENTS = os.environ.get("SAVE_SEGMENTS", "0") == "1"  # Also write the normalized segments as PNG files, for debugging
+
+class Segment:
+    """
+    A chemical structure depiction found on a page, normalized for prediction.
+
+    `name` is the name of the PNG file the segment used to be saved as ('<stem>_<index>.png'),
+    which the prediction files keep as the segment identifier. `bbox` is the (y0, x0, y1, x1)
+    box of the depiction in the page rendered at the segmentation resolution, or None when the
+    installed decimer_segmentation does not report boxes.
+    """
+    def __init__(self, page_index: int, bbox, image: np.ndarray, name: str = None):
+        self.page_index = page_index
+        self.bbox = tuple(int(value) for value in bbox) if bbox is not None else None
+        self.image = image
+        self.name = name
+
+    def __repr__(self):
+        page = self.page_index + 1 if self.page_index is not None else None
+        return f"Segment({self.name!r}, page={page}, bbox={self.bbox})"
+
+def reports_bboxes():
+    """Whether the installed decimer_segmentation can return the boxes of the segments."""
+    import inspect
+    from decimer_segmentation import segment_chemical_structures
+    return 'return_bboxes' in inspect.signature(segment_chemical_structures).parameters
+
+def page_segments(image, page_index: int = None):
+    """
+    Segment chemical structures in one page image and normalize them for prediction.
+
+    Args:
+        image (PIL.Image or np.array): Rendered page.
+        page_index (int, optional): Page of the image (0-based index), kept in the segments.
+
+    Returns:
+        list: Segments, in the order decimer_segmentation returns them.
+    """
+    configure_tensorflow()
+    from decimer_segmentation import segment_chemical_structures
+
+    if reports_bboxes():
+        raw_segments, bboxes = segment_chemical_structures(np.array(image), expand=True, return_bboxes=True)
+    else:
+        raw_segments = segment_chemical_structures(np.array(image), expand=True)
+        bboxes = [None] * len(raw_segments)
+    # Normalize here, so that workers send back small grayscale squares instead of page crops
+    return [
+        Segment(page_index, bbox, get_square_image(segment, SEGMENT_SIZE) if segment.size > 0 else None)
+        for segment, bbox in zip(raw_segments, bboxes)
     ]
-    save_images(
-        normalized_segments,
-        segment_dir,
-        f"{os.path.split(input_path)[1][:-4]}",
-    )
+
+def segment_page(pdf_path, page_index: int, dpi: int = SEGMENTATION_DPI):
+    """
+    Segment chemical structures in one page of a PDF file, e.g. in a watchdog worker.
+
+    Args:
+        pdf_path (str or Path): Path to the PDF file.
+        page_index (int): Page to segment (0-based index).
+        dpi (int, optional): Resolution used to render the page. Defaults to SEGMENTATION_DPI.
+
+    Returns:
+        list: Segments of the page.
+    """
+    segments = []
+    for _, image in iter_page_images(pdf_path, [page_index], dpi):
+        segments += page_segments(image, page_index)
+    return segments
+
+def segmentation_processes(workers: int = SEGMENTATION_WORKERS):
+    """Worker processes running the segmentation model for `workers` parallel pages, 0 if it runs in this process."""
+    return max(1, workers) if workers > 1 or watchdog_enabled("segmentation") else 0
+
+def iter_page_segments(pages: PageRange, dpi: int = SEGMENTATION_DPI, workers: int = SEGMENTATION_WORKERS):
+    """
+    Segment chemical structures in the pages of an in-memory page view, page by page.
+
+    When an inference server is running (see utils/inference_server.py), pages are segmented by
+    its already loaded model. Otherwise pages are spread over `workers` watchdog worker processes,
+    each loading the segmentation model once. Pages are rendered in this process, through the
+    raster cache the OCR of the process reads too, and sent to the workers; when the stage has a
+    time budget, workers render their pages themselves, so that the budget covers rendering.
+    Pages are submitted a few ahead of the one being returned (at most twice `workers`, capped by
+    MAX_RASTERS), and results come back in page order. A page that goes over the time budget of
+    the 'segmentation' stage gives no segments. With a single worker and no time budget, pages
+    are segmented in this process instead.
+
+    Args:
+        pages (PageRange): Page view to segment.
+        dpi (int, optional): Resolution used to render the pages. Defaults to SEGMENTATION_DPI.
+        workers (int, optional): Pages segmented at once. Defaults to the SEGMENTATION_WORKERS environment variable.
+
+    Yields:
+        tuple: (page_index, segments of the page), in page order.
+    """
+    timeout = stage_budget("segmentation")[0]
+    for position, page_index in enumerate(pages):
+        start = time.monotonic()
+        try:
+            yield page_index, request('segment_page', str(pages.path), page_index, dpi, timeout=timeout)
+        except ServerUnavailable:
+            # Segment the remaining pages without the server
+            pages = PageRange(pages.document, pages.pages[position:], pages.stem)
+            break
+        except TimeoutError as e:
+            run_report.record_skip(pages.document.name, "segmentation", page_index, str(e), time.monotonic() - start)
+            pages.document.skip_page(page_index)
+            yield page_index, []
+    else:
+        return
+
+    if not segmentation_processes(workers):
+        for page_index, image in iter_page_images(pages.path, pages.pages, dpi):
+            yield page_index, page_segments(image, page_index)
+        return
+
+    in_flight = max(1, min(workers, raster_budget.limit))
+    pool = get_pool("segmentation", in_flight)
+
+    def run(function, args, page_index):
+        try:
+            return pool.run(function, args, pages.document.name, page_index)
+        except PageSkipped:
+            pages.document.skip_page(page_index)
+            return []
+
+    if watchdog_enabled("segmentation"):
+        tasks = ((page_index, segment_page, (str(pages.path), page_index, dpi)) for page_index in pages)
+    else:
+        tasks = ((page_index, page_segments, (np.asarray(image), page_index)) for page_index, image in iter_page_images(pages.path, pages.pages, dpi))
+
+    # Threads only wait on the worker processes; the window bounds the rasters and results held
+    with ThreadPoolExecutor(max_workers=in_flight) as executor:
+        pending = deque()
+        for page_index, function, args in tasks:
+            pending.append((page_index, executor.submit(run, function, args, page_index)))
+            if len(pending) >= 2 * in_flight:
+                page_index, future = pending.popleft()
+                yield page_index, future.result()
+        while pending:
+            page_index, future = pending.popleft()
+            yield page_index, future.result()
+
+def segment_page_range(pages: PageRange, dpi: int = SEGMENTATION_DPI, workers: int = SEGMENTATION_WORKERS):
+    """
+    Segment chemical structures in the pages of an in-memory page view, see iter_page_segments.
+
+    Returns:
+        list: Segments in page order.
+    """
+    return [segment for _, segments in iter_page_segments(pages, dpi, workers) for segment in segments]
+
+def save_segments(segments, segment_dir):
+    """Write normalized segments as '<segment_dir>/<name>' PNG files, for debugging."""
+    os.makedirs(segment_dir, exist_ok=True)
+    for segment in segments:
+        Image.fromarray(segment.image).save(os.path.join(segment_dir, segment.name))
     print(f"Segments saved at {segment_dir}.")
 
-    # Clean up temporary files
-    for file in glob.glob(os.path.join(segment_dir, "*_orig_*.png")):
-        os.remove(file)
-    for file in glob.glob(os.path.join(segment_dir, "*_bnw_*.png")):
-        os.remove(file)
+def name_segments(segments, name: str, folder_name, save: bool = SAVE_SEGMENTS):
+    """
+    Number the segments of a view as the PNG files used to be ('<name>_<index>.png'), drop empty
+    crops, and save them in '<folder_name>/segments' if asked.
+
+    Returns:
+        list: Named segments.
+    """
+    for index, segment in enumerate(segments):
+        segment.name = f"{name}_{index}.png"
+    segments = [segment for segment in segments if segment.image is not None]
+
+    if save:
+        save_segments(segments, os.path.join(folder_name, "segments"))
+    return segments
+
+def segment_views(views, output_folder=None, save: bool = SAVE_SEGMENTS, workers: int = SEGMENTATION_WORKERS):
+    """
+    Segment several page views of the same document in parallel, see iter_page_segments.
+
+    Args:
+        views (list): Page views of one document.
+        output_folder (str, optional): Folder in which a '<stem>/segments' folder is created for each
+            view when segments are saved. Defaults to the folder of the document.
+        save (bool, optional): Whether to also write the segments as PNG files. Defaults to the
+            SAVE_SEGMENTS environment variable, or False.
+        workers (int, optional): Pages segmented at once. Defaults to the SEGMENTATION_WORKERS environment variable.
+
+    Yields:
+        tuple: (view, named segments of the view), in the order of `views`.
+    """
+    views = list(views)
+    if not views:
+        return
+    pages = PageRange(views[0].document, [page_index for view in views for page_index in view.pages])
+    by_page = iter_page_segments(pages, workers=workers)
+    for view in views:
+        segments = []
+        for _ in view.pages:
+            segments += next(by_page)[1]
+        yield view, name_segments(segments, view.stem, os.path.join(output_folder if output_folder else view.path.parent, view.stem), save)
+
+def chemical_structure_segmentation(input_path, output_folder=None, save: bool = SAVE_SEGMENTS):
+    """
+    Segment chemical structures in a document and normalize them to undistorted square
+    grayscale images, kept in memory for prediction.
+
+    Args:
+        input_path (PageRange or str): Page view or path to the input document.
+        output_folder (str, optional): Folder in which the '<name>/segments' folder is created when
+            segments are saved. Defaults to the folder of the input file.
+        save (bool, optional): Whether to also write the segments as PNG files. Defaults to the
+            SAVE_SEGMENTS environment variable, or False.
+
+    Returns:
+        list: Segments in page order, named '<name>_<index>.png'.
+    """
+    if isinstance(input_path, PageRange):
+        name = input_path.stem
+        segments = segment_page_range(input_path)
+        folder_name = os.path.join(output_folder if output_folder else input_path.path.parent, name)
+    elif str(input_path).lower().endswith('.pdf'):
+        name = os.path.splitext(os.path.basename(input_path))[0]
+        with shared_document(input_path) as document:
+            segments = segment_page_range(as_page_range(document))
+        folder_name = os.path.join(output_folder, name) if output_folder else os.path.splitext(input_path)[0]  # Remove file extension
+    else:
+        # A single image
+        name = os.path.splitext(os.path.basename(input_path))[0]
+        segments = page_segments(Image.open(input_path).convert('RGB'))
+        folder_name = os.path.join(output_folder, name) if output_folder else os.path.splitext(input_path)[0]
+
+    return name_segments(segments, name, folder_name, save)
 
 def get_square_image(image: np.array, desired_size: int) -> np.array:
     """
@@ -75,4 +284,4 @@ if __name__ == "__main__":
     if len(sys.argv) != 2:
         print("Usage: python pdf_to_img.py <input_path>")
     else:
-        chemical_structure_segmentation(sys.argv[1])
\ No newline at end of file
+        chemical_structure_segmentation(sys.argv[1], save=True)
\ No newline at end of file
@@ -1,6 +1,8 @@
 import csv
 import os
 import re
+import shutil
+import string
 import tempfile
 
 def preprocess_csv_text(csv_file):
@@ -10,15 +12,29 @@ def preprocess_csv_text(csv_file):
     Args:
         csv_file (str): Path to the input CSV file.
 
+    Returns:
+        str: Path to the preprocessed text file.
+    """
+    with open(csv_file, 'r', encoding='utf-8') as csvfile:
+        return preprocess_table_rows(csv.reader(csvfile, delimiter=','))
+
+def preprocess_table_rows(rows):
+    """
+    Filters and formats the example and name columns of table rows, e.g. the rows of
+    converter.table_rows, and saves the result as a text file.
+
+    Args:
+        rows (iterable): Table rows as lists of strings, the first one being the header.
+
     Returns:
         str: Path to the preprocessed text file.
     """
     # Create a temporary file to store the preprocessed text
     preprocessed_csv_txt_file = tempfile.mktemp(suffix='.txt')
 
-    # Open the CSV file for reading and the temporary text file for writing
-    with open(csv_file, 'r', encoding='utf-8') as csvfile, open(preprocessed_csv_txt_file, 'w', encoding='utf-8') as txtfile:
-        reader = csv.reader(csvfile, delimiter=',')
+    # Open the temporary text file for writing
+    with open(preprocessed_csv_txt_file, 'w', encoding='utf-8') as txtfile:
+        reader = iter(rows)
         header_row = next(reader, None)
 
         if header_row is not None:
@@ -59,7 +75,257 @@ def preprocess_csv_text(csv_file):
 
     return preprocessed_csv_txt_file
 
-def preprocess_text(text_or_path, output_path):
+class TextRule:
+    """
+    One rewriting rule of the text preprocessor, compiled once at import time.
+
+    Args:
+        pattern (str): Regular expression, or literal text if `literal` is True.
+        replacement (str): Replacement string, with group references for regular expressions.
+        flags (int, optional): Regular expression flags. Defaults to 0.
+        literal (bool, optional): Apply the rule with str.replace instead of a regular expression. Defaults to False.
+        requires (str, optional): Literal substring every match contains; the pass is skipped when it is absent.
+    """
+    def __init__(self, pattern, replacement, flags=0, literal=False, requires=None):
+        self.pattern = pattern if literal else re.compile(pattern, flags)
+        self.replacement = replacement
+        self.literal = literal
+        self.requires = requires if requires is not None else (pattern if literal else None)
+
+    def apply(self, text):
+        if self.requires is not None and self.requires not in text:
+            return text
+        if self.literal:
+            return text.replace(self.pattern, self.replacement)
+        return self.pattern.sub(self.replacement, text)
+
+class StripRule:
+    r"""
+    Delete the whitespace before and/or after every occurrence of a separator, like
+    re.sub(r'\s*<separator>\s*', '<separator>', text) but with C-level string methods.
+
+    Args:
+        separator (str): Separator character.
+        before (bool): Delete the whitespace preceding each separator.
+        after (bool): Delete the whitespace following each separator.
+    """
+    def __init__(self, separator, before, after):
+        self.separator = separator
+        self.before = before
+        self.after = after
+
+    def apply(self, text):
+        pieces = text.split(self.separator)
+        if len(pieces) == 1:
+            return text
+        first, middle, last = pieces[0], pieces[1:-1], pieces[-1]
+        if self.before and self.after:
+            middle = [piece.strip() for piece in middle]
+        elif self.before:
+            middle = [piece.rstrip() for piece in middle]
+        else:
+            middle = [piece.lstrip() for piece in middle]
+        if self.before:
+            first = first.rstrip()
+        if self.after:
+            last = last.lstrip()
+        return self.separator.join([first, *middle, last])
+
+class TrailingWhitespaceRule:
+    r"""
+    Same result as re.sub(r'\s+$', '', text, flags=re.MULTILINE), line by line: trailing
+    whitespace is removed from every line and whitespace-only lines are dropped, except the
+    first line, which is kept empty.
+    """
+    def apply(self, text):
+        lines = text.split('\n')
+        return '\n'.join([lines[0].rstrip()] + [line.rstrip() for line in lines[1:] if line.strip()])
+
+# Rules of preprocess_text, in application order. They give the same result as the original
+# sequence of re.sub and str.replace calls, with fewer and cheaper passes:
+# - rules starting with a lookbehind or a class are rewritten to start with a literal, which
+#   the regex engine can search for quickly, e.g. '(?<=\n)-' becomes '-(?<=\n-)';
+# - the '[\\s\S]' class of the paragraph-merging rule is the same as '\S';
+# - bracket spacing rules only delete whitespace runs touching a bracket, whatever their order,
+#   so the opening brackets are handled in one pass;
+# - '(Preparation of):' cannot match once ':' is gone;
+# - empty lines are dropped anyway by the IUPAC character filter of filter_iupac_lines.
+PREPROCESS_RULES = [
+    # Remove isolated numbers at the beginning of lines and wrap paragraph if it starts with an isolated number
+    TextRule(r'(?<=\n)(\d+)\s+(?=[^-,a-zA-Z])', r'\n', requires='\n'),
+    TextRule(r'-(?<=\n-)\s*(\d+)\s*-(?=\n)', r'\n', requires='\n-'),
+    TextRule(r'-(?<=\n-)\s*(\d+)\s*-(?=\s*\n)', r'\n', requires='\n-'),
+    # Remove trailing spaces at the end of each paragraph
+    TrailingWhitespaceRule(),
+    # Merge paragraphs ending or starting with the '-' symbol
+    TextRule(r'-(?<=\S-)\n\s*', '-', requires='-\n'),
+    TextRule(r'\n-(\S*)', r'\1-', requires='\n-'),
+    # Replace 'l' with '1' in specific cases
+    *[TextRule(rep_l, rep_l.replace('l', '1'), literal=True) for rep_l in ['lH', '(l(', ')l)', '-l-', '-l)', '(l-', 'yl)', 'l,', ',l']],
+    *[TextRule(rep_v, rep_v.replace('v', 'y'), literal=True) for rep_v in ['cvc', 'nvl', 'xvc', 'pvr', 'zvl', 'hvl']],
+    # Remove unwanted spaces
+    TextRule(r'([(\[{])\s+', r'\1'),
+    StripRule(')', before=True, after=False),
+    StripRule(']', before=True, after=False),
+    StripRule('}', before=True, after=False),
+    StripRule('-', before=True, after=True),
+    TextRule(r'\-l\s+', '-1', requires='-l'),
+    TextRule(r'(\d)\s*,\s*(\d)', r'\1,\2', requires=','),
+    # Replace number 1 with letter 'l' in specific cases where 'y1' is present
+    TextRule('y1', 'yl', literal=True),
+    TextRule('-IH', '-1H', literal=True),
+    # Find and replace words starting with 'l-' ('l' not preceded by a word character)
+    TextRule(r'l(?<!\wl)-', '1-', requires='l-'),
+    # Remove ':' from strings "Example + number:" and "Preparation of:"
+    TextRule(':', '', literal=True),
+    TextRule('Preparation ofN', 'Preparation of N', literal=True),
+]
+
+# Paragraphs containing other characters are not IUPAC names
+VALID_IUPAC_PATTERN = re.compile(r'^[a-zA-Z0-9,\-\(\)\[\]\{\}\.\s]+$')
+
+def iter_iupac_lines(lines):
+    """
+    Keep only the lines made of characters valid in IUPAC names, then drop lines of fewer
+    than 5 characters, except the last one. Lines are read lazily with one line of lookahead.
+
+    Args:
+        lines (iterable): Lines without their newline character.
+
+    Yields:
+        str: Kept lines.
+    """
+    pending = None
+    for line in lines:
+        if VALID_IUPAC_PATTERN.match(line.strip()):
+            if pending is not None and len(pending) > 4:
+                yield pending
+            pending = line
+    if pending is not None:
+        yield pending
+
+def filter_iupac_lines(text):
+    """
+    Keep only the lines made of characters valid in IUPAC names, then delete lines of fewer
+    than 5 characters, except the last one, in a single pass over the lines.
+
+    Args:
+        text (str): Text to filter.
+
+    Returns:
+        str: Filtered text.
+    """
+    return '\n'.join(iter_iupac_lines(text.split('\n')))
+
+def apply_preprocess_rules(text):
+    """
+    Apply PREPROCESS_RULES and the line filter to a text.
+
+    Args:
+        text (str): Text to preprocess.
+
+    Returns:
+        str: Preprocessed text.
+    """
+    for rule in PREPROCESS_RULES:
+        text = rule.apply(text)
+    return filter_iupac_lines(text)
+
+STREAM_CHUNK_LINES = 256  # Lines gathered before looking for a place to cut the stream
+STREAM_MAX_LINES = 4096  # Lookahead bound: the stream is cut here even without a safe place
+
+# No rule reads or deletes a newline between a line ending with one of these characters and a
+# line starting with a letter, so the text on each side can be preprocessed on its own
+SAFE_LINE_ENDS = frozenset(string.ascii_letters + string.digits + '.)]}') - {'l'}
+SAFE_LINE_STARTS = frozenset(string.ascii_letters)
+
+def is_safe_boundary(line, next_line):
+    """
+    Check whether the newline between two lines can be used to cut the text for streaming,
+    looking at the characters around it.
+
+    Args:
+        line (str): Line before the newline.
+        next_line (str): Line after the newline.
+
+    Returns:
+        bool: True if no rule reads or deletes the newline.
+    """
+    return bool(line) and bool(next_line) and line[-1] in SAFE_LINE_ENDS and next_line[0] in SAFE_LINE_STARTS
+
+def iter_text_lines(path):
+    """
+    Read a text file lazily, line by line, with the same lines as f.read().split('\\n').
+
+    Args:
+        path (str or Path): Path to the text file.
+
+    Yields:
+        str: Lines without their newline character.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        line = ''
+        for line in f:
+            yield line[:-1] if line.endswith('\n') else line
+        if not line or line.endswith('\n'):
+            yield ''
+
+def iter_preprocessed_lines(lines, chunk_lines: int = STREAM_CHUNK_LINES, max_lines: int = STREAM_MAX_LINES):
+    """
+    Streaming version of apply_preprocess_rules. Lines are gathered into chunks cut at safe
+    boundaries (see is_safe_boundary), each chunk goes through PREPROCESS_RULES on its own, and
+    the line filter runs over the whole stream, so memory use depends on the chunk size only.
+
+    The output is the same as apply_preprocess_rules, unless no safe boundary is found within
+    `max_lines` lines and the stream has to be cut anyway.
+
+    Args:
+        lines (iterable): Lines of the text, without their newline character.
+        chunk_lines (int, optional): Lines gathered before cutting at the next safe boundary. Defaults to STREAM_CHUNK_LINES.
+        max_lines (int, optional): Maximum lines held at once. Defaults to STREAM_MAX_LINES.
+
+    Yields:
+        str: Preprocessed lines.
+    """
+    def chunks():
+        buffer = []
+        previous = ''  # Last line with content other than an isolated number, which rules may delete
+        dash_paragraph = False  # Whether the paragraph of `previous`, merged on trailing '-', starts with '-'
+        for line in lines:
+            # Paragraphs starting with '-' are left whole: merging them may move a '-' to their end
+            if buffer and (len(buffer) >= max_lines or (len(buffer) >= chunk_lines and not dash_paragraph and is_safe_boundary(buffer[-1], line))):
+                yield '\n'.join(buffer)
+                buffer = []
+            buffer.append(line)
+            if line.strip() and not line.strip().isdigit():
+                continued = dash_paragraph and previous.rstrip().endswith('-')
+                dash_paragraph = continued or line.lstrip().startswith('-')
+                previous = line
+        yield '\n'.join(buffer)
+
+    def rewritten_lines():
+        for chunk in chunks():
+            for rule in PREPROCESS_RULES:
+                chunk = rule.apply(chunk)
+            yield from chunk.split('\n')
+
+    return iter_iupac_lines(rewritten_lines())
+
+def write_lines(lines, output_path):
+    """
+    Write lines to a text file, separated by newlines, without a trailing newline.
+
+    Args:
+        lines (iterable): Lines to write.
+        output_path (str or Path): Path of the output file.
+    """
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for i, line in enumerate(lines):
+            if i:
+                f.write('\n')
+            f.write(line)
+
+def preprocess_text(text_or_path, output_path, streaming: bool = False):
     """
     Preprocesses text to merge paragraphs ending with '-' or '- ', replaces 'l' with '1' in specific cases,
     replaces number 1 with letter 'l' in specific cases where the text combination "y1" is present,
@@ -69,69 +335,27 @@ def preprocess_text(text_or_path, output_path):
     Args:
         text_or_path (str): Text content or path to the input text file.
         output_path (str): Path to save the preprocessed text.
+        streaming (bool, optional): Read, preprocess and write the text in chunks of lines, so that
+            long patents are never held in memory at once. Defaults to False.
 
     Returns:
         str: Path to the preprocessed text file.
     """
+    is_path = os.path.exists(text_or_path)
+
+    if streaming:
+        lines = iter_text_lines(text_or_path) if is_path else text_or_path.split('\n')
+        write_lines(iter_preprocessed_lines(lines), output_path)
+        return output_path
+
     # Load text from file if input is a file path
-    if os.path.exists(text_or_path):
+    if is_path:
         with open(text_or_path, 'r', encoding='utf-8') as f:
             text = f.read()
     else:
         text = text_or_path
 
-    # Remove isolated numbers at the beginning of lines and wrap paragraph if it starts with an isolated number
-    text = re.sub(r'(?<=\n)(\d+)\s+(?=[^-,a-zA-Z])', r'\n', text)
-    text = re.sub(r'(?<=\n)-\s*(\d+)\s*-(?=\n)', r'\n', text)
-    text = re.sub(r'(?<=\n)-\s*(\d+)\s*-(?=\s*\n)', r'\n', text)
-
-    # Remove trailing spaces at the end of each paragraph
-    text = re.sub(r'\s+$', '', text, flags=re.MULTILINE)
-
-    # Merge paragraphs ending or starting with the '-' symbol
-    text = re.sub(r'(\S)-\n\s*', r'\1-', text)
-    text = re.sub(r'\n-([\\s\S]*)', r'\1-', text)
-
-    # Replace 'l' with '1' in specific cases
-    l_replacements = ['lH', '(l(', ')l)', '-l-', '-l)', '(l-', 'yl)', 'l,', ',l',]
-    v_replacements = ['cvc', 'nvl', 'xvc', 'pvr', 'zvl', 'hvl', ]
-    for rep_l in l_replacements:
-        text = text.replace(rep_l, rep_l.replace('l', '1'))
-    for rep_v in v_replacements:
-        text = text.replace(rep_v, rep_v.replace('v', 'y'))
-
-    # Remove unwanted spaces
-    text = re.sub(r'\(\s+', '(', text)
-    text = re.sub(r'\s+\)', ')', text)
-    text = re.sub(r'\[\s+', '[', text)
-    text = re.sub(r'\s+\]', ']', text)
-    text = re.sub(r'\{\s+', '{', text)
-    text = re.sub(r'\s+\}', '}', text)
-    text = re.sub(r'\s*-\s*', '-', text)
-    text = re.sub(r'\-l\s+', '-1', text)
-    text = re.sub(r'(\d)\s*,\s*(\d)', r'\1,\2', text)
-
-    # Replace number 1 with letter 'l' in specific cases where 'y1' is present
-    text = text.replace('y1', 'yl')
-    text = text.replace('-IH', '-1H')
-
-    # Find and replace words starting with 'l-'
-    text = re.sub(r'\bl-', '1-', text)
-
-    # Remove ':' from strings "Example + number:" and "Preparation of:"
-    text = re.sub(r':', '', text)
-    text = re.sub(r'(Preparation of):', r'Preparation of ', text)
-    text = re.sub(r'(Preparation ofN)', r'Preparation of N', text)
-
-    # Remove empty lines
-    text = re.sub(r'^\s*\n', '', text, flags=re.MULTILINE)
-
-    # Remove paragraphs containing invalid characters for IUPAC names
-    valid_iupac_pattern = re.compile(r'^[a-zA-Z0-9,\-\(\)\[\]\{\}\.\s]+$')
-    text = '\n'.join(line for line in text.split('\n') if valid_iupac_pattern.match(line.strip()))
-
-    # Delete paragraphs containing fewer than 5 characters
-    text = re.sub(r'^.{1,4}$[\s\S]*?\n', '', text, flags=re.MULTILINE)
+    text = apply_preprocess_rules(text)
 
     # Save preprocessed text to the specified output file
     with open(output_path, 'w', encoding='utf-8') as f:
@@ -149,9 +373,9 @@ def merge_text_files(txt_file1, txt_file2, output_file):
         output_file (str): Path to save the merged text file.
 
     """
-    # Open both input files for reading and the output file for writing
+    # Open both input files for reading and the output file for writing, and copy them in blocks
     with open(txt_file1, 'r', encoding='utf-8') as file1, open(txt_file2, 'r', encoding='utf-8') as file2, open(output_file, 'w', encoding='utf-8') as outfile:
-        outfile.write(file1.read())
+        shutil.copyfileobj(file1, outfile)
         outfile.write('\n')
-        outfile.write(file2.read())
+        shutil.copyfileobj(file2, outfile)
     print(f"Preprocessed combined text has been created in {output_file}.")
\ No newline at end of file
@@ -1,122 +1,136 @@
 import csv
+import io
 import os
-import fitz
-import PyPDF2
-import pytesseract
-import re
+import shutil
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from chemdataextractor.doc import Document
-from pdf2image import convert_from_path
-from utils.preprocessor import preprocess_text
+from utils.activity import activity_dict, parse_activity
+from utils.chemdata import parse_paragraphs
+from utils.converter import table_rows
+from utils.document import as_page_range
+from utils.name_filter import NAME_PREFILTER, is_name_candidate
+from utils.ocr import ocr_pages
+from utils.preprocessor import iter_text_lines, preprocess_text
+from utils.triage import needs_ocr
 
-def extract_text_from_pdf(pdf_file, output_folder):
+def extract_text_from_pdf(pdf_file, output_folder, ocr_workers: int = None):
     """
-    Extracts text from a PDF file using PyMuPDF. Uses Tesseract OCR if PyMuPDF fails.
+    Extracts text from a PDF file page by page using PyMuPDF. Pages without a usable text
+    layer, or on which PyMuPDF fails, are read with Tesseract OCR instead.
     
     Args:
-        pdf_file (str): Path to the input PDF file.
+        pdf_file (PageRange or str): Page view or path to the input PDF file.
+        output_folder (Path): Path to the output folder.
+        ocr_workers (int, optional): Number of OCR processes. Defaults to the OCR_WORKERS environment variable, or 1.
 
     Returns:
         str: Path to the extracted text file.
     """
+    pages = as_page_range(pdf_file)
+
     # Generate the output text file path
-    base_name = os.path.splitext(os.path.basename(pdf_file))[0]
-    txt_file = output_folder / f'{base_name}.txt'
+    txt_file = output_folder / f'{pages.stem}.txt'
 
-    try:
-        # Attempt to open the PDF file using PyMuPDF (fitz)
-        doc = fitz.open(pdf_file)
-        text = ""
+    # Keep the PyMuPDF text of each page and collect the pages that need OCR
+    page_texts = {}
+    for page_num in pages:
+        try:
+            if needs_ocr(pages.document, page_num):
+                continue
+            page_texts[page_num] = pages.get_text(page_num)
+        except Exception as e:
+            print(f"PyMuPDF failed on page {page_num + 1} with error: {e}. Trying OCR...")
 
-        # Iterate through each page in the PDF and extract text
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            text += page.get_text()
+    ocr_page_nums = [page_num for page_num in pages if page_num not in page_texts]
+    if ocr_page_nums:
+        print(f"OCR on {len(ocr_page_nums)} of {len(pages)} pages of {pages.stem}.")
+        page_texts.update(ocr_pages(pages.document, ocr_page_nums, workers=ocr_workers))
 
-        # Check if extracted text is empty
-        if not text.strip():
-            raise ValueError("Empty text extracted")
+    # Write the extracted text to a text file, in page order
+    with open(txt_file, 'w', encoding='utf-8') as f:
+        for page_num in pages:
+            f.write(page_texts[page_num])
 
-        # Write the extracted text to a text file
-        with open(txt_file, 'w', encoding='utf-8') as f:
-            f.write(text)
+    return txt_file
 
-    except Exception as e:
-        # If PyMuPDF fails, attempt OCR using Tesseract
-        print(f"PyMuPDF failed with error: {e}. Trying OCR...")
-        ocr_text = ""
-        images = convert_from_path(pdf_file)
+def iter_example_paragraphs(paragraphs):
+    """
+    Pair each paragraph following an 'Example' heading with the example number, merged with the
+    next paragraph unless that one is another heading.
 
-        # Process each page image using Tesseract OCR and concatenate results
-        for image in images:
-            ocr_text += pytesseract.image_to_string(image, lang='eng')
+    Args:
+        paragraphs (iterable): Paragraphs of the preprocessed text, read with one paragraph of lookahead.
 
-        # Write the OCR extracted text to a text file
-        with open(txt_file, 'w', encoding='utf-8') as f:
-            f.write(ocr_text)
+    Yields:
+        tuple: (example number, paragraph to parse).
+    """
+    paragraphs = iter(paragraphs)
+    current_example = None
 
-    return txt_file
+    next_paragraph = next(paragraphs, None)
+    while next_paragraph is not None:
+        paragraph, next_paragraph = next_paragraph, next(paragraphs, None)
+
+        # Check if the paragraph contains 'Example'
+        if 'Example' in paragraph:
+            current_example = paragraph.split(' ')[-1]
+            continue
+
+        # Check if current_example is not None and process the next paragraph
+        if current_example is not None:
+            if next_paragraph is not None and 'Example' not in next_paragraph:
+                paragraph += ' ' + next_paragraph
+            yield current_example, paragraph
+            current_example = None
 
-def extract_molecules_from_text(txt_file):
+def extract_molecules_from_text(txt_file, cde_workers: int = None, prefilter: bool = NAME_PREFILTER, preprocess: bool = True):
     """
     Extracts molecules from preprocessed text using ChemDataExtractor, focusing on 'Example' strings.
     
     Args:
         txt_file (str): Path to the preprocessed text file.
+        cde_workers (int, optional): Number of ChemDataExtractor processes. Defaults to the CDE_WORKERS environment variable, or 1.
+        prefilter (bool, optional): Only parse paragraphs containing a word that looks like a systematic name.
+            Defaults to False, unless the NAME_PREFILTER environment variable is 1.
+        preprocess (bool, optional): Preprocess the text first and write the result back to `txt_file`.
+            Pass False for text that is already preprocessed. Defaults to True.
 
     Returns:
         list: List of dictionaries containing extracted molecules and their corresponding examples.
     """
-    # Read the preprocessed text from the input file
-    with open(txt_file, 'r', encoding='utf-8') as f:
-        text = f.read()
+    if preprocess:
+        # Generate the path for the preprocessed text file
+        preprocessed_txt_path = os.path.splitext(txt_file)[0] + '_preprocessed.txt'
 
-    # Generate the path for the preprocessed text file
-    preprocessed_txt_path = os.path.splitext(txt_file)[0] + '_preprocessed.txt'
+        # Preprocess the text to handle specific formatting issues, streaming it from file to file
+        preprocess_text(txt_file, preprocessed_txt_path, streaming=True)
+    else:
+        preprocessed_txt_path = txt_file
 
-    # Preprocess the text to handle specific formatting issues
-    preprocess_text(text, preprocessed_txt_path)
-
-    # Read the preprocessed text after preprocessing
-    with open(preprocessed_txt_path, 'r', encoding='utf-8') as f:
-        preprocessed_text = f.read()
-
-    # Split the preprocessed text into paragraphs
-    paragraphs = preprocessed_text.split('\n')
+    # Parse the example paragraphs with ChemDataExtractor, in batches over a process pool;
+    # results come back in paragraph order
     molecules = []
-    current_example = None
-
-    # Iterate through each paragraph to extract molecules
-    for i, paragraph in enumerate(paragraphs):
-        # Check if the paragraph contains 'Example'
-        if 'Example' in paragraph:
-            current_example = paragraph.split(' ')[-1]
-            continue
-
-        # Check if current_example is not None and process the next paragraph
-        if current_example is not None:
-            if i < len(paragraphs) - 1:
-                next_paragraph = paragraphs[i + 1]
-                if 'Example' not in next_paragraph:
-                    paragraph += ' ' + next_paragraph
-
-            # Use ChemDataExtractor to parse compounds from the paragraph
-            compounds = Document(paragraph).records.serialize()
-
-            # Extract molecule names and add to molecules list
-            for compound in compounds:
-                if compound.get('names'):
-                    molecule_name = compound['names'][0]
-                    if ' ' in molecule_name:
-                        molecule_name = molecule_name.split(' ')[0]
-                    molecules.append({'Example': 'Example ' + current_example, 'Molecule': molecule_name})
-            current_example = None
+    skipped = 0
+
+    def candidate_jobs():
+        nonlocal skipped
+        for current_example, paragraph in iter_example_paragraphs(iter_text_lines(preprocessed_txt_path)):
+            # Paragraphs without any name morphology are not worth a ChemDataExtractor call
+            if prefilter and not is_name_candidate(paragraph):
+                skipped += 1
+                continue
+            yield current_example, paragraph
+
+    for current_example, names in parse_paragraphs(candidate_jobs(), workers=cde_workers):
+        for molecule_name in names:
+            molecules.append({'Example': 'Example ' + current_example, 'Molecule': molecule_name})
+    if skipped:
+        print(f"Name prefilter: skipped {skipped} example paragraphs without systematic names.")
 
     # Write the preprocessed text back to the original txt_file
-    with open(txt_file, 'w', encoding='utf-8') as f:
-        f.write(preprocessed_text)
+    if preprocess:
+        shutil.copyfile(preprocessed_txt_path, txt_file)
 
     return molecules
 
@@ -129,83 +143,90 @@ def extract_activity_from_csv(csv_file):
     Returns:
         dict: Dictionary containing molecule IDs as keys and activity data as values.
     """
-    activity_data = {}  # Dictionary to store activity data
-
     try:
         with open(csv_file, 'r') as file:
-            lines = file.readlines()
-
-            for line in lines:
-                match = re.match(r'^(Example\s+)?([0-9A-Z]+),(\d{1,3}(?:,\d{3})*|\d+|([\d.,]+))$', line.strip())
-                if match:
-                    molecule_id = match.group(1) + match.group(2) if match.group(1) else match.group(2)
-                    activity = match.group(3).replace(',', '')  # Remove commas from activity
-                    activity_data[molecule_id] = activity
+            return extract_activity_from_lines(file)
     except Exception as e:
         print(f"Error processing {csv_file}: {e}")
         return {}
 
-    return activity_data
-
-def extract_activity_from_pdf(pdf_file):
+def extract_activity_from_tables(tables):
     """
-    Extracts activity data from a PDF file. Handles both text-based and image-based PDFs.
+    Extracts activity data from in-memory tables, matching their rows formatted as CSV lines.
 
     Args:
-        pdf_file (Path): Path to the PDF file.
+        tables (list): (sheet_name, rows) pairs, see converter.extract_tables.
 
     Returns:
         dict: Dictionary containing molecule IDs as keys and activity data as values.
     """
-    activity_data = {}  # Dictionary to store activity data
-    text_extracted = False
+    def csv_lines():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in table_rows(tables):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerow(row)
+            yield buffer.getvalue()
 
     try:
-        # Attempt to read the PDF with PyPDF2
-        with open(pdf_file, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page_num in range(len(pdf_reader.pages)):
-                try:
-                    page = pdf_reader.pages[page_num]
-                    text = page.extract_text()
-                    if text:  # If text is extracted, save to a temporary .txt file and process it
-                        text_extracted = True
-                        temp_txt_file = pdf_file.with_stem(pdf_file.stem + f"_page_{page_num + 1}").with_suffix('.txt')
-                        with open(temp_txt_file, 'w') as txt_file:
-                            txt_file.write(text)
-                        
-                        lines = text.split('\n')
-                        for line in lines:
-                            match = re.match(r'^(Example\s+)?([0-9A-Z]+)\s+(\d{1,3}(?:,\d{3})*|\d+|([\d.,]+))$', line.strip())
-                            if match:
-                                molecule_id = match.group(1) + match.group(2) if match.group(1) else match.group(2)
-                                activity = match.group(3).replace(',', '')  # Remove commas from activity
-                                activity_data[molecule_id] = activity
-                except Exception as page_error:
-                    print(f"Error processing page {page_num + 1} of {pdf_file}: {page_error}")
+        return extract_activity_from_lines(csv_lines())
+    except Exception as e:
+        print(f"Error processing tables: {e}")
+        return {}
+
+def extract_activity_from_lines(lines):
+    """
+    Extracts activity data from lines of the form '[Example ]<id>,<activity>' or '[Example ]<id> <activity>',
+    see activity.parse_activity.
+
+    Args:
+        lines (iterable): CSV or text lines.
+
+    Returns:
+        dict: Dictionary containing molecule IDs as keys and activity data as values.
+    """
+    return activity_dict(parse_activity(lines))
+
+def extract_activity_from_pdf(pdf_file, ocr_workers: int = None):
+    """
+    Extracts activity data from a PDF file. Handles both text-based and image-based pages:
+    pages with a PyPDF2 text layer are parsed directly, scanned pages are read with OCR.
 
+    Args:
+        pdf_file (PageRange or Path): Page view or path to the PDF file.
+        ocr_workers (int, optional): Number of OCR processes. Defaults to the OCR_WORKERS environment variable, or 1.
+
+    Returns:
+        dict: Dictionary containing molecule IDs as keys and activity data as values.
+    """
+    text_lines = []  # Lines of the pages with a text layer
+    ocr_page_nums = []  # Pages without a text layer
+
+    try:
+        # Read the text layer of each page with PyPDF2
+        pages = as_page_range(pdf_file)
+        for page_num in pages:
+            try:
+                text = pages.get_text(page_num, backend="pypdf")
+                if text:  # If text is extracted, keep its lines for parsing
+                    text_lines += text.split('\n')
+                elif needs_ocr(pages.document, page_num):
+                    ocr_page_nums.append(page_num)
+            except Exception as page_error:
+                print(f"Error processing page {page_num + 1} of {pdf_file}: {page_error}")
+
+        activity_data = extract_activity_from_lines(text_lines)
     except Exception as e:
         print(f"Error processing {pdf_file}: {e}")
         return {}
 
-    if not text_extracted:
-        # If no text is extracted, use OCR
+    if ocr_page_nums:
+        # Use OCR only on the pages without text
         try:
-            images = convert_from_path(pdf_file)
-            for i, image in enumerate(images):
-                text = pytesseract.image_to_string(image)
-                temp_txt_file = pdf_file.with_stem(pdf_file.stem + f"_page_{i + 1}_ocr").with_suffix('.txt')
-                with open(temp_txt_file, 'w') as txt_file:
-                    txt_file.write(text)
-
-                lines = text.split('\n')
-                for line in lines:
-                    line = line.replace(',', '')
-                    match = re.match(r'^(Example\s+)?([0-9A-Z]+)\s+(\d+(\.\d+)?)$', line.strip())
-                    if match:
-                        molecule_id = match.group(2)
-                        activity = match.group(3)
-                        activity_data[molecule_id] = activity
+            page_texts = ocr_pages(pages.document, ocr_page_nums, workers=ocr_workers)
+            ocr_lines = [line for page_num in ocr_page_nums for line in page_texts[page_num].split('\n')]
+            activity_data.update(extract_activity_from_lines(ocr_lines))
         except Exception as e:
             print(f"Error processing {pdf_file} with OCR: {e}")
             return {}
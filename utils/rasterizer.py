@@ -0,0 +1,130 @@
+import os
+import sys
+import threading
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from collections import OrderedDict
+
+RASTER_DPI = int(os.environ.get("RASTER_DPI", "300"))  # Default rendering resolution of OCR and segmentation, equal so that they share cached rasters
+MAX_RASTERS = int(os.environ.get("MAX_RASTERS", "8"))  # Page rasters held at once by the consumers of the whole process
+RASTER_CACHE_PAGES = int(os.environ.get("RASTER_CACHE_PAGES", "4"))  # Rendered pages kept for other stages, 0 to not keep any
+
+_render_lock = threading.Lock()
+
+class RasterBudget:
+    """
+    Counts the page rasters held in memory by all streaming consumers of the process.
+
+    A consumer takes one permit before each page is rendered (or read from the raster cache)
+    and gives it back when it moves past the image. As no consumer holds more than one permit
+    while waiting for another, consumers cannot block each other on a partly taken budget.
+    """
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.in_use = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, count: int = 1):
+        with self._condition:
+            while self.in_use + count > self.limit:
+                self._condition.wait()
+            self.in_use += count
+
+    def release(self, count: int = 1):
+        if count <= 0:
+            return
+        with self._condition:
+            self.in_use -= count
+            self._condition.notify_all()
+
+raster_budget = RasterBudget(MAX_RASTERS)
+
+def render_page(pdf_path, page_index: int, dpi: int = RASTER_DPI):
+    """
+    Render one page of a PDF file in process with PyMuPDF.
+
+    Args:
+        pdf_path (str or Path): Path to the PDF file.
+        page_index (int): Page to render (0-based index).
+        dpi (int, optional): Rendering resolution. Defaults to RASTER_DPI.
+
+    Returns:
+        PIL.Image: RGB raster of the page.
+    """
+    from PIL import Image
+    from utils.document import worker_document
+
+    # PyMuPDF documents are not thread-safe
+    with _render_lock:
+        pixmap = worker_document(str(pdf_path), "fitz").load_page(page_index).get_pixmap(dpi=dpi, alpha=False)
+        return Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+
+class RasterCache:
+    """
+    Page rasters kept after rendering, keyed by PDF file, page and resolution, so that the stages
+    reading the same page at the same resolution in a process (OCR of the text and activity
+    pipelines, structure segmentation) render it once. A request for a page that another thread
+    is rendering waits for that rendering. Beyond `size` rasters, the least recently used one is
+    dropped. Cached rasters are shared: consumers must not modify them.
+    """
+    def __init__(self, size: int):
+        self.size = max(0, size)
+        self._rasters = OrderedDict()
+        self._rendering = {}
+        self._lock = threading.Lock()
+
+    def get(self, pdf_path, page_index: int, dpi: int = RASTER_DPI):
+        """Raster of a page, rendered on first request, see render_page."""
+        key = (os.path.abspath(pdf_path), page_index, dpi)
+        while True:
+            with self._lock:
+                if key in self._rasters:
+                    self._rasters.move_to_end(key)
+                    return self._rasters[key]
+                rendering = self._rendering.get(key)
+                if rendering is None:
+                    rendering = self._rendering[key] = threading.Event()
+                    break
+            # Another thread is rendering the page: use its raster once it is cached
+            rendering.wait()
+
+        try:
+            image = render_page(pdf_path, page_index, dpi)
+            with self._lock:
+                if self.size:
+                    self._rasters[key] = image
+                    while len(self._rasters) > self.size:
+                        self._rasters.popitem(last=False)
+        finally:
+            with self._lock:
+                del self._rendering[key]
+            rendering.set()
+        return image
+
+    def clear(self):
+        with self._lock:
+            self._rasters.clear()
+
+raster_cache = RasterCache(RASTER_CACHE_PAGES)
+
+def iter_page_images(pdf_path, page_indices, dpi: int = RASTER_DPI):
+    """
+    Render pages of a PDF file lazily, one at a time, within the process-wide raster budget.
+    Pages already in the raster cache at this resolution are not rendered again.
+
+    Args:
+        pdf_path (str or Path): Path to the PDF file.
+        page_indices (iterable): Pages to render (0-based indices), in order.
+        dpi (int, optional): Rendering resolution. Defaults to RASTER_DPI.
+
+    Yields:
+        tuple: (page_index, PIL image) in page order.
+    """
+    for page_index in page_indices:
+        raster_budget.acquire(1)
+        try:
+            image = raster_cache.get(pdf_path, page_index, dpi)
+            yield page_index, image
+            del image  # Only the consumer and the cache keep a reference from now on
+        finally:
+            raster_budget.release(1)
@@ -0,0 +1,94 @@
+import json
+import os
+import threading
+import time
+
+RUN_REPORT = os.environ.get("RUN_REPORT", "run_report.json")  # Path of the JSON run report, empty to not write it
+
+class RunReport:
+    """
+    Events of a run worth reviewing afterwards, collected from every pipeline of the process:
+    the pages skipped because they went over a budget, and named counters.
+    """
+    def __init__(self):
+        self.started = time.time()
+        self.skipped = []
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def record_skip(self, document: str, stage: str, page_index: int, reason: str, seconds: float):
+        """
+        Record a page left out of a stage.
+
+        Args:
+            document (str): Name of the PDF file.
+            stage (str): Stage that gave up on the page.
+            page_index (int): Skipped page (0-based index).
+            reason (str): Why the page was skipped.
+            seconds (float): Time spent on the page before it was skipped.
+        """
+        with self._lock:
+            self.skipped.append({
+                'document': document,
+                'stage': stage,
+                'page': page_index + 1,
+                'reason': reason,
+                'seconds': round(seconds, 3),
+            })
+        print(f"Skipped page {page_index + 1} of {document} in stage {stage}: {reason}.")
+
+    def count(self, name: str, amount: int = 1):
+        """Add `amount` to the counter `name`."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def hit_rates(self):
+        """
+        Hit rate of each cache counted as '<cache>_misses' and one or more '<cache>_..._hits' counters.
+
+        Returns:
+            dict: Hit rate of each cache, between 0 and 1.
+        """
+        with self._lock:
+            counters = dict(self.counters)
+        rates = {}
+        for name, misses in counters.items():
+            if name.endswith('_misses'):
+                prefix = name[:-len('_misses')]
+                hits = sum(count for counter, count in counters.items() if counter.startswith(f"{prefix}_") and counter.endswith('_hits'))
+                if hits + misses:
+                    rates[prefix] = round(hits / (hits + misses), 4)
+        return rates
+
+    def as_dict(self):
+        rates = self.hit_rates()
+        with self._lock:
+            return {
+                'started': self.started,
+                'finished': time.time(),
+                'skipped_pages': list(self.skipped),
+                'counters': dict(self.counters),
+                'hit_rates': rates,
+            }
+
+    def write(self, path=None):
+        """
+        Write the report as JSON.
+
+        Args:
+            path (str or Path, optional): Output file. Defaults to the RUN_REPORT environment variable, or 'run_report.json'.
+
+        Returns:
+            str or Path: Path of the report, or None if no path is configured.
+        """
+        path = path if path else RUN_REPORT
+        if not path:
+            return None
+        report = self.as_dict()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        if report['skipped_pages']:
+            print(f"{len(report['skipped_pages'])} pages skipped, see {path}.")
+        return path
+
+run_report = RunReport()  # Shared by every pipeline of the process
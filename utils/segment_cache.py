@@ -0,0 +1,189 @@
+import hashlib
+import numpy as np
+import os
+import sqlite3
+import sys
+import threading
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from functools import lru_cache
+from PIL import Image
+from utils.cache import CACHE_DIR, CACHE_ENABLED, MISSING
+
+PHASH_MAX_DISTANCE = int(os.environ.get("PHASH_MAX_DISTANCE", "-1"))  # Differing hash bits still accepted as a near duplicate, at most 7; -1 for exact lookups only
+SEGMENT_CACHE_MAX_ENTRIES = int(os.environ.get("SEGMENT_CACHE_MAX_ENTRIES", "500000"))
+HASH_SIZE = 16  # The perceptual hash keeps the 16x16 lowest DCT frequencies, i.e. 256 bits
+HASH_IMAGE_SIZE = 64  # Side of the grayscale thumbnail the hash is computed on
+HASH_BANDS = 8  # 32-bit bands indexed for near lookups: two hashes within 7 bits share at least one band
+
+def gray_image(image):
+    """Load a segment (PNG path or array) as a 2D uint8 grayscale array."""
+    image = Image.open(image) if isinstance(image, (str, os.PathLike)) else Image.fromarray(np.asarray(image))
+    return np.asarray(image.convert('L'))
+
+def pixel_digest(gray: np.ndarray):
+    """SHA-256 hex digest of the pixels of a grayscale image and its shape, for exact lookups."""
+    digest = hashlib.sha256(f"{gray.shape}".encode('utf-8'))
+    digest.update(np.ascontiguousarray(gray).tobytes())
+    return digest.hexdigest()
+
+@lru_cache(maxsize=None)
+def dct_matrix(size: int):
+    """Orthonormal DCT-II matrix of a given size."""
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.sqrt(2 / size) * np.cos(np.pi * (2 * n + 1) * k / (2 * size))
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+def perceptual_hash(gray: np.ndarray):
+    """
+    DCT perceptual hash of a grayscale image: each low-frequency coefficient of a 64x64
+    thumbnail is compared with their median. Renderings of the same depiction that differ
+    by antialiasing or a few pixels get the same hash, or hashes a few bits apart.
+
+    Returns:
+        int: 256-bit hash.
+    """
+    thumbnail = np.asarray(Image.fromarray(gray).resize((HASH_IMAGE_SIZE, HASH_IMAGE_SIZE), Image.LANCZOS), dtype=np.float64)
+    matrix = dct_matrix(HASH_IMAGE_SIZE)
+    frequencies = (matrix @ thumbnail @ matrix.T)[:HASH_SIZE, :HASH_SIZE].flatten()
+    bits = frequencies > np.median(frequencies[1:])  # The DC term only measures brightness
+    return int(''.join('1' if bit else '0' for bit in bits), 2)
+
+def hash_bands(phash: int):
+    """Split a hash into HASH_BANDS integers, for the band indexes."""
+    width = HASH_SIZE * HASH_SIZE // HASH_BANDS
+    return [(phash >> (band * width)) & ((1 << width) - 1) for band in range(HASH_BANDS)]
+
+def hamming(a: int, b: int):
+    return bin(a ^ b).count('1')
+
+@lru_cache(maxsize=None)
+def decimer_version():
+    """Installed DECIMER version, read without importing DECIMER (and TensorFlow)."""
+    from importlib.metadata import PackageNotFoundError, version
+    try:
+        return version('decimer')
+    except PackageNotFoundError:
+        return 'unknown'
+
+class SegmentCache:
+    """
+    Persistent store of the SMILES predicted for normalized segment images, in a local SQLite file.
+
+    Segments are found by the digest of their pixels (exact duplicates). Near duplicates, e.g. the
+    same depiction rendered from another page or patent of the family, are looked up by a perceptual
+    hash at most `max_distance` bits away only when `max_distance` is 0 or more: two different
+    structures can share a hash, so near lookups are opt-in. Entries are tied to the DECIMER version
+    that predicted them. When the store grows over `max_entries`, the least recently used entries
+    are evicted until it is back under 90% of the limit.
+    """
+    EVICTION_INTERVAL = 64  # Puts between two size checks
+
+    def __init__(self, path, max_entries: int = SEGMENT_CACHE_MAX_ENTRIES, max_distance: int = PHASH_MAX_DISTANCE):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.max_distance = min(max(-1, max_distance), HASH_BANDS - 1)
+        self._lock = threading.Lock()
+        self._puts = 0
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        bands = ", ".join(f"b{band} INTEGER NOT NULL" for band in range(HASH_BANDS))
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS segments ("
+                f"digest TEXT NOT NULL, model TEXT NOT NULL, phash TEXT NOT NULL, {bands}, "
+                "smiles TEXT NOT NULL, last_access REAL NOT NULL, PRIMARY KEY (digest, model))"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS segments_phash ON segments (phash)")
+            for band in range(HASH_BANDS):
+                self._connection.execute(f"CREATE INDEX IF NOT EXISTS segments_b{band} ON segments (b{band})")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS segments_last_access ON segments (last_access)")
+        self.evict()
+
+    def get(self, gray: np.ndarray, model: str):
+        """
+        Look up the SMILES predicted for a segment.
+
+        Args:
+            gray (np.ndarray): Grayscale segment, see gray_image.
+            model (str): Version of the predicting model.
+
+        Returns:
+            tuple: (SMILES, 'exact' or 'near'), or (MISSING, None) if the segment is not stored.
+        """
+        digest = pixel_digest(gray)
+        with self._lock, self._connection:
+            row = self._connection.execute("SELECT smiles FROM segments WHERE digest = ? AND model = ?", (digest, model)).fetchone()
+            if row is not None:
+                self._connection.execute("UPDATE segments SET last_access = ? WHERE digest = ? AND model = ?", (time.time(), digest, model))
+                return row[0], 'exact'
+        if self.max_distance < 0:
+            return MISSING, None
+
+        phash = perceptual_hash(gray)
+        with self._lock, self._connection:
+            if self.max_distance == 0:
+                candidates = self._connection.execute("SELECT digest, phash, smiles FROM segments WHERE phash = ? AND model = ?", (f"{phash:064x}", model)).fetchall()
+            else:
+                # Candidates share a band with the hash, then the exact distance is checked
+                condition = " OR ".join(f"b{band} = ?" for band in range(HASH_BANDS))
+                candidates = self._connection.execute(f"SELECT digest, phash, smiles FROM segments WHERE model = ? AND ({condition})", (model, *hash_bands(phash))).fetchall()
+            matches = [(hamming(phash, int(stored, 16)), stored_digest, smiles) for stored_digest, stored, smiles in candidates]
+            matches = [match for match in matches if match[0] <= self.max_distance]
+            if not matches:
+                return MISSING, None
+            _, stored_digest, smiles = min(matches)
+            self._connection.execute("UPDATE segments SET last_access = ? WHERE digest = ? AND model = ?", (time.time(), stored_digest, model))
+        return smiles, 'near'
+
+    def put(self, gray: np.ndarray, model: str, smiles: str):
+        """Store the SMILES predicted for a segment (an empty string if there was no prediction)."""
+        phash = perceptual_hash(gray)
+        bands = hash_bands(phash)
+        with self._lock, self._connection:
+            self._connection.execute(
+                f"INSERT OR REPLACE INTO segments VALUES (?, ?, ?, {', '.join('?' * HASH_BANDS)}, ?, ?)",
+                (pixel_digest(gray), model, f"{phash:064x}", *bands, smiles or "", time.time()),
+            )
+            self._puts += 1
+            check_size = self._puts % self.EVICTION_INTERVAL == 0
+        if check_size:
+            self.evict()
+
+    def evict(self):
+        """Drop least recently used entries until the store is under 90% of `max_entries`."""
+        with self._lock, self._connection:
+            count = self._connection.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+            if count <= self.max_entries:
+                return
+            excess = count - int(self.max_entries * 0.9)
+            self._connection.execute(
+                "DELETE FROM segments WHERE rowid IN (SELECT rowid FROM segments ORDER BY last_access LIMIT ?)", (excess,)
+            )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+_segment_cache = None
+_segment_cache_lock = threading.Lock()
+
+def get_segment_cache():
+    """
+    Get the process-wide segment cache, stored as `<CACHE_DIR>/segments.sqlite`.
+
+    Returns:
+        SegmentCache or None: The cache, or None if caching is disabled with PATENT_CACHE=0.
+    """
+    global _segment_cache
+    if not CACHE_ENABLED:
+        return None
+    with _segment_cache_lock:
+        if _segment_cache is None:
+            _segment_cache = SegmentCache(os.path.join(CACHE_DIR, "segments.sqlite"))
+        return _segment_cache
@@ -0,0 +1,129 @@
+import hashlib
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pathlib import Path
+from utils.cache import MISSING, cache_key, get_cache
+from utils.document import PageRange
+
+class Stage:
+    """
+    One step of a pipeline, reading named input artifacts and writing named text-file artifacts.
+
+    The stage function is called with the input values (file paths, or source values such as a
+    page view) followed by the output paths, in declaration order, plus `params` as keyword
+    arguments. It must write every output file.
+
+    Args:
+        name (str): Stage name, part of the memoization key.
+        function (callable): Function computing the outputs.
+        inputs (list): Names of the artifacts the stage reads.
+        outputs (dict): Output artifact names mapped to file names, formatted with `base`.
+        params (dict, optional): Settings passed to the function, part of the memoization key.
+        version (int, optional): Bump it when the function changes, to invalidate memoized outputs. Defaults to 1.
+        memoize (bool, optional): Whether outputs may be reused from a previous run. Defaults to True.
+    """
+    def __init__(self, name, function, inputs, outputs, params=None, version: int = 1, memoize: bool = True):
+        self.name = name
+        self.function = function
+        self.inputs = list(inputs)
+        self.outputs = dict(outputs)
+        self.params = dict(params) if params else {}
+        self.version = version
+        self.memoize = memoize
+
+def file_digest(path):
+    """SHA-256 hex digest of a file's content, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def order_stages(stages, available):
+    """
+    Sort stages so that each one runs after the stages producing its inputs.
+
+    Args:
+        stages (list): Stages of the graph.
+        available (iterable): Names of the source artifacts.
+
+    Returns:
+        list: Stages in execution order.
+    """
+    available = set(available)
+    pending = list(stages)
+    ordered = []
+    while pending:
+        ready = [stage for stage in pending if all(name in available for name in stage.inputs)]
+        if not ready:
+            missing = sorted({name for stage in pending for name in stage.inputs} - available)
+            raise ValueError(f"No stage produces the artifacts {missing}.")
+        for stage in ready:
+            ordered.append(stage)
+            available.update(stage.outputs)
+            pending.remove(stage)
+    return ordered
+
+def is_incomplete(name, value, incomplete):
+    """Whether an input artifact misses skipped pages: a page view with skipped pages, or an output computed from one."""
+    if isinstance(value, PageRange):
+        return value.document.has_skipped(value)
+    return name in incomplete
+
+def run_stages(stages, sources, output_folder, base_name):
+    """
+    Run a stage graph, reusing the outputs of any stage whose inputs and settings are unchanged
+    since a previous run.
+
+    Each stage is memoized in the 'stages' on-disk cache under a key built from its name,
+    version, settings and the digests of its inputs, so a change re-runs only the stages that
+    depend on it, directly or through changed artifacts. Outputs computed from a page view in
+    which a stage skipped pages (see PatentDocument.skip_page), or from such incomplete outputs,
+    are not memoized, so that the skipped pages get another chance in the next run, as with the
+    page caches.
+
+    Args:
+        stages (list): Stages of the graph, in any order.
+        sources (dict): Source artifacts, as names mapped to (value, digest) pairs.
+        output_folder (Path): Folder in which the output files are written.
+        base_name (str): Name formatted into the output file names.
+
+    Returns:
+        dict: Every artifact name mapped to its value, i.e. the file path for stage outputs.
+    """
+    output_folder = Path(output_folder)
+    cache = get_cache("stages")
+    values = {name: value for name, (value, _) in sources.items()}
+    digests = {name: digest for name, (_, digest) in sources.items()}
+    incomplete = set()
+
+    for stage in order_stages(stages, sources):
+        outputs = {name: output_folder / file_name.format(base=base_name) for name, file_name in stage.outputs.items()}
+        key = cache_key("stage", stage.name, stage.version, stage.params, [digests[name] for name in stage.inputs])
+        stored = cache.get(key) if cache is not None and stage.memoize else MISSING
+
+        if stored is MISSING:
+            stage.function(*[values[name] for name in stage.inputs], *outputs.values(), **stage.params)
+            if any(is_incomplete(name, values[name], incomplete) for name in stage.inputs):
+                print(f"Stage {stage.name}: pages were skipped, its outputs are not memoized.")
+                incomplete.update(outputs)
+            elif cache is not None and stage.memoize:
+                stored = {}
+                for name, path in outputs.items():
+                    with open(path, 'r', encoding='utf-8', newline='') as f:
+                        stored[name] = f.read()
+                cache.put(key, stored)
+        else:
+            # Restore the outputs of the previous run instead of recomputing them
+            print(f"Stage {stage.name}: inputs unchanged, reusing its outputs.")
+            for name, path in outputs.items():
+                with open(path, 'w', encoding='utf-8', newline='') as f:
+                    f.write(stored[name])
+
+        for name, path in outputs.items():
+            values[name] = path
+            digests[name] = file_digest(path)
+
+    return values
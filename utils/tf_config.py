@@ -0,0 +1,71 @@
+import os
+import threading
+
+# TensorFlow resources, read when a process configures TensorFlow so that the launcher can set them for its workers:
+#   TF_DEVICE            'cpu' to hide GPUs, 'gpu' to require one, 'auto' (default) to use a GPU when there is one
+#   TF_THREAD_BUDGET     cores shared by every TensorFlow process of a run (default: all cores)
+#   TF_WORKERS           TensorFlow processes sharing the budget (default: 1)
+#   TF_INTRA_OP_THREADS  threads of one process for the work inside an op (default: budget / workers)
+#   TF_INTER_OP_THREADS  threads of one process for running independent ops (default: 2, or 1 on small shares)
+TF_DEVICES = ('auto', 'cpu', 'gpu')
+
+_configured = False
+_configure_lock = threading.Lock()
+
+def thread_counts():
+    """
+    Thread counts of this process's TensorFlow runtime, from its share of the thread budget.
+
+    Returns:
+        tuple: (intra-op threads, inter-op threads).
+    """
+    budget = int(os.environ.get("TF_THREAD_BUDGET", os.cpu_count() or 1))
+    workers = max(1, int(os.environ.get("TF_WORKERS", "1")))
+    share = max(1, budget // workers)
+    intra = int(os.environ.get("TF_INTRA_OP_THREADS", share))
+    inter = int(os.environ.get("TF_INTER_OP_THREADS", 2 if share >= 4 else 1))
+    return intra, inter
+
+def share_thread_budget(workers: int, budget: int = None):
+    """
+    Split the TensorFlow thread budget across `workers` processes. Set in the environment, the
+    split applies to this process and to every worker process started afterwards.
+
+    Args:
+        workers (int): TensorFlow processes sharing the budget.
+        budget (int, optional): Cores to share. Defaults to the TF_THREAD_BUDGET environment variable, or all cores.
+    """
+    if budget:
+        os.environ["TF_THREAD_BUDGET"] = str(budget)
+    os.environ["TF_WORKERS"] = str(max(1, workers))
+
+def configure_tensorflow():
+    """
+    Apply the device and thread settings to TensorFlow, once per process. It must run before
+    DECIMER or decimer_segmentation are imported, as they start the TensorFlow runtime, after
+    which these settings can no longer change.
+    """
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        _configured = True
+
+        device = os.environ.get("TF_DEVICE", "auto").lower()
+        if device not in TF_DEVICES:
+            raise ValueError(f"TF_DEVICE must be one of {', '.join(TF_DEVICES)}, not {device!r}")
+        if device == 'cpu':
+            os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
+        import tensorflow as tf
+
+        if device == 'gpu' and not tf.config.list_physical_devices('GPU'):
+            raise RuntimeError("TF_DEVICE=gpu but TensorFlow sees no GPU")
+        try:
+            intra, inter = thread_counts()
+            tf.config.threading.set_intra_op_parallelism_threads(intra)
+            tf.config.threading.set_inter_op_parallelism_threads(inter)
+            if device == 'cpu':
+                tf.config.set_visible_devices([], 'GPU')
+        except RuntimeError as e:
+            # The runtime was started before this call, e.g. by an earlier import of DECIMER
+            print(f"TensorFlow already initialized, device and thread settings not applied: {e}")
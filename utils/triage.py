@@ -0,0 +1,170 @@
+import os
+import re
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.document import PageRange, as_page_range, worker_document
+from utils.watchdog import PageSkipped, run_page, watchdog_enabled
+
+TEXT = "text"
+TABLE = "table"
+STRUCTURE = "structure"
+
+MIN_TEXT_CHARS = 20  # Pages with fewer characters in their text layer are treated as scanned
+MIN_RULINGS = 2  # pdfplumber needs at least two horizontal and two vertical edges to build a cell
+MIN_BOND_LINES = 6  # Diagonal vector segments needed before a drawing is considered a structure
+
+EXAMPLE_PATTERN = re.compile(r'\bExample\b')
+
+def count_rulings(drawings):
+    """
+    Count the horizontal, vertical and diagonal line segments of a page's vector drawings.
+
+    Rectangles count as two horizontal and two vertical edges, since pdfplumber uses rectangle
+    edges as table rulings too.
+
+    Args:
+        drawings (list): Output of PyMuPDF `page.get_drawings()`.
+
+    Returns:
+        tuple: (horizontal, vertical, diagonal) counts.
+    """
+    horizontal = vertical = diagonal = 0
+    for drawing in drawings:
+        for item in drawing.get("items", []):
+            if item[0] == "l":
+                p1, p2 = item[1], item[2]
+                if abs(p1.y - p2.y) < 1:
+                    horizontal += 1
+                elif abs(p1.x - p2.x) < 1:
+                    vertical += 1
+                else:
+                    diagonal += 1
+            elif item[0] in ("re", "qu"):
+                rect = item[1] if item[0] == "re" else item[1].rect
+                if rect.height <= 2:
+                    horizontal += 1
+                elif rect.width <= 2:
+                    vertical += 1
+                else:
+                    horizontal += 2
+                    vertical += 2
+    return horizontal, vertical, diagonal
+
+def page_shapes(page):
+    """
+    Read what triage needs from the drawing layer of a page: its embedded images and vector drawings.
+
+    Args:
+        page (fitz.Page): PyMuPDF page.
+
+    Returns:
+        tuple: (images, horizontal, vertical, diagonal) counts.
+    """
+    return (len(page.get_images(full=True)), *count_rulings(page.get_drawings()))
+
+def worker_page_shapes(pdf_path: str, page_index: int):
+    """page_shapes of one page of a PDF file, in a watchdog worker."""
+    return page_shapes(worker_document(pdf_path, "fitz").load_page(page_index))
+
+def triage_page(text: str, shapes):
+    """
+    Tag a page with the pipelines that need it, using only cheap PyMuPDF queries.
+
+    - 'text': the page has a usable text layer, or is scanned and needs OCR.
+    - 'table': the page has enough horizontal and vertical rulings for pdfplumber to find a table.
+    - 'structure': the page has embedded images or diagonal vector lines that may be a depiction.
+
+    Args:
+        text (str): Text layer of the page.
+        shapes (tuple): (images, horizontal, vertical, diagonal) counts, see page_shapes.
+
+    Returns:
+        dict: Tags of the page under 'tags', plus the counts used to decide them.
+    """
+    chars = len(text.strip())
+    images, horizontal, vertical, diagonal = shapes
+
+    tags = set()
+    if chars >= MIN_TEXT_CHARS or images:
+        tags.add(TEXT)
+    if horizontal >= MIN_RULINGS and vertical >= MIN_RULINGS:
+        tags.add(TABLE)
+    if images or diagonal >= MIN_BOND_LINES:
+        tags.add(STRUCTURE)
+
+    return {
+        'tags': frozenset(tags),
+        'chars': chars,
+        'images': images,
+        'rulings': (horizontal, vertical),
+        'diagonals': diagonal,
+        'examples': len(EXAMPLE_PATTERN.findall(text)),
+    }
+
+def page_tags(document, page_index: int):
+    """
+    Get the triage tags of a page, computing them once per document.
+
+    The document lock is only held while PyMuPDF reads the page, so other pipelines sharing the
+    document are not held up by the tagging. When the 'triage' stage has a time budget, the
+    drawings are read in a watchdog worker instead, and a page that goes over the budget is
+    tagged for every pipeline, so that it is not dropped.
+
+    Args:
+        document (PatentDocument): Shared document handle.
+        page_index (int): Page to triage (0-based index).
+
+    Returns:
+        frozenset: Tags of the page.
+    """
+    with document.lock:
+        if page_index in document.triage:
+            return document.triage[page_index]['tags']
+
+    text = document.get_text(page_index)
+    if watchdog_enabled("triage"):
+        try:
+            shapes = run_page("triage", worker_page_shapes, (str(document.path), page_index), document.name, page_index)
+        except PageSkipped:
+            # Unknown drawings: count an image and enough lines for every tag, so no pipeline drops the page
+            shapes = (1, MIN_RULINGS, MIN_RULINGS, MIN_BOND_LINES)
+    else:
+        with document.lock:
+            shapes = page_shapes(document.fitz_page(page_index))
+
+    with document.lock:
+        return document.triage.setdefault(page_index, triage_page(text, shapes))['tags']
+
+def needs_ocr(document, page_index: int):
+    """
+    Check whether a page lacks a usable text layer but carries images, i.e. is a scan worth OCRing.
+
+    Args:
+        document (PatentDocument): Shared document handle.
+        page_index (int): Page to check (0-based index).
+
+    Returns:
+        bool: True if the page should be read with OCR.
+    """
+    page_tags(document, page_index)
+    info = document.triage[page_index]
+    return info['chars'] < MIN_TEXT_CHARS and info['images'] > 0
+
+def select_pages(pdf, tag: str):
+    """
+    Restrict a page view to the pages tagged for one pipeline.
+
+    Args:
+        pdf (PageRange or PatentDocument or Path): Page view, document handle or PDF path.
+        tag (str): TEXT, TABLE or STRUCTURE.
+
+    Returns:
+        PageRange: View with the same name over the matching pages only.
+    """
+    pages = as_page_range(pdf)
+    selected = [page_index for page_index in pages if tag in page_tags(pages.document, page_index)]
+    skipped = len(pages) - len(selected)
+    if skipped:
+        print(f"Triage: skipping {skipped} of {len(pages)} pages of {pages.stem} for {tag} extraction.")
+    return PageRange(pages.document, selected, pages.stem)
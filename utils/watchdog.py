@@ -0,0 +1,284 @@
+import atexit
+import multiprocessing
+import os
+import sys
+import threading
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from concurrent.futures import ThreadPoolExecutor
+from utils.run_report import run_report
+
+PAGE_TIMEOUT = float(os.environ.get("PAGE_TIMEOUT", "0"))  # Seconds a page may spend in one stage, e.g. 300; 0 (default) to run stages in process, without a budget
+PAGE_MEMORY_MB = int(os.environ.get("PAGE_MEMORY_MB", "0"))  # Resident memory a stage worker may reach, 0 for no limit
+POLL_INTERVAL = 0.05  # Seconds between two checks of a busy worker
+# Stages cheap enough per page that a round trip to a worker costs more than it protects: they run
+# in process unless PAGE_TIMEOUT_<STAGE> is set, e.g. PAGE_TIMEOUT_TEXT=30
+IN_PROCESS_STAGES = ('text',)
+
+class PageSkipped(Exception):
+    """Raised when a page goes over the time or memory budget of a stage."""
+    def __init__(self, stage: str, page_index: int, reason: str):
+        super().__init__(f"page {page_index + 1} skipped in stage {stage}: {reason}")
+        self.stage = stage
+        self.page_index = page_index
+        self.reason = reason
+
+def worker_context():
+    """
+    Multiprocessing context of the worker processes: a fork server when the platform has one, so
+    that workers never inherit the locks held by the threads of the parent, else spawn.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+def stage_budget(stage: str):
+    """
+    Time and memory budget of one page in a stage. PAGE_TIMEOUT_<STAGE> and PAGE_MEMORY_MB_<STAGE>
+    override the PAGE_TIMEOUT and PAGE_MEMORY_MB defaults, e.g. PAGE_TIMEOUT_OCR=60. The stages of
+    IN_PROCESS_STAGES have no time budget unless their own variable is set.
+
+    Args:
+        stage (str): Stage name: 'triage', 'text', 'tables', 'ocr' or 'segmentation'.
+
+    Returns:
+        tuple: (timeout in seconds, memory limit in MB), 0 meaning no limit.
+    """
+    suffix = stage.upper()
+    timeout = float(os.environ.get(f"PAGE_TIMEOUT_{suffix}", 0 if stage in IN_PROCESS_STAGES else PAGE_TIMEOUT))
+    memory_mb = int(os.environ.get(f"PAGE_MEMORY_MB_{suffix}", PAGE_MEMORY_MB))
+    return timeout, memory_mb
+
+def watchdog_enabled(stage: str):
+    """Whether the pages of a stage run in watched worker processes, i.e. the stage has a time budget."""
+    return stage_budget(stage)[0] > 0
+
+def process_rss_mb(pid: int):
+    """Resident memory of a process in MB, or None where /proc is not available."""
+    try:
+        with open(f"/proc/{pid}/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, IndexError):
+        return None
+
+def serve(connection):
+    """
+    Worker loop: run the (function, args) tasks received on `connection` one at a time and send
+    back (True, result) or (False, error message), until None is received.
+    """
+    while True:
+        try:
+            task = connection.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        function, args = task
+        try:
+            result = (True, function(*args))
+        except Exception as e:
+            result = (False, f"{type(e).__name__}: {e}")
+        try:
+            connection.send(result)
+        except Exception as e:
+            connection.send((False, f"Could not send the result back: {e}"))
+
+class StageWorker:
+    """A worker process serving the tasks of one stage, started on creation."""
+    def __init__(self, context):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=serve, args=(child_connection,), daemon=True)
+        self.process.start()
+        child_connection.close()
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.kill()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+class WatchdogPool:
+    """
+    Worker processes running the pages of one stage under its per-page budget.
+
+    Each page is sent to an idle worker, which the calling thread watches: a worker that runs
+    past the time budget, goes over the memory budget or dies is killed, the page is recorded
+    as skipped in the run report, and a fresh worker takes its place. Workers are long-lived,
+    so backends and models are loaded once per worker, not once per page.
+
+    Workers are started from a fork server when the platform has one, so that they never
+    inherit the locks held by the threads of the parent.
+    """
+    def __init__(self, stage: str, workers: int = 1):
+        self.stage = stage
+        self.size = max(1, workers)
+        self.timeout, self.memory_mb = stage_budget(stage)
+        self._context = worker_context()
+        self._idle = []
+        self._started = 0
+        # Guards the idle workers and the worker count; waiters are woken whenever a worker is
+        # given back, discarded (which frees a slot for a fresh one) or the pool grows
+        self._condition = threading.Condition()
+
+    def grow(self, workers: int):
+        """Allow up to `workers` worker processes."""
+        with self._condition:
+            if workers > self.size:
+                self.size = workers
+                self._condition.notify_all()
+
+    def _acquire(self):
+        with self._condition:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._started < self.size:
+                    self._started += 1
+                    break
+                self._condition.wait()
+        try:
+            return StageWorker(self._context)
+        except Exception:
+            self._discard(None)
+            raise
+
+    def _release(self, worker: StageWorker):
+        """Give a worker back to the pool."""
+        with self._condition:
+            self._idle.append(worker)
+            self._condition.notify()
+
+    def _discard(self, worker):
+        """Kill a worker and free its slot, so that a waiting caller starts a fresh one."""
+        if worker is not None:
+            worker.kill()
+        with self._condition:
+            self._started -= 1
+            self._condition.notify()
+
+    def _watch(self, worker: StageWorker, deadline: float):
+        """Wait for the result of the task sent to `worker`, returning (result, None) or (None, reason)."""
+        while True:
+            try:
+                if worker.connection.poll(POLL_INTERVAL):
+                    return worker.connection.recv(), None
+            except (EOFError, OSError):
+                pass
+            if not worker.process.is_alive():
+                return None, f"worker exited with code {worker.process.exitcode}"
+            if self.timeout and time.monotonic() > deadline:
+                return None, f"over the {self.timeout:g} s time budget"
+            if self.memory_mb:
+                rss = process_rss_mb(worker.process.pid)
+                if rss is not None and rss > self.memory_mb:
+                    return None, f"over the {self.memory_mb} MB memory budget ({rss:.0f} MB)"
+
+    def run(self, function, args, document: str, page_index: int):
+        """
+        Run `function(*args)` on one page in a worker process, within the budget of the stage.
+        `function` and its arguments must be picklable, i.e. module-level functions and plain values.
+
+        Args:
+            function (callable): Page function.
+            args (tuple): Arguments of the function.
+            document (str): Name of the PDF file, for the run report.
+            page_index (int): Page being processed (0-based index), for the run report.
+
+        Returns:
+            The result of the function.
+
+        Raises:
+            PageSkipped: If the page went over the budget of the stage.
+            RuntimeError: If the function raised, with the message of the exception.
+        """
+        worker = self._acquire()
+        start = time.monotonic()
+        try:
+            worker.connection.send((function, args))
+            result, reason = self._watch(worker, start + self.timeout)
+        except BaseException:
+            self._discard(worker)
+            raise
+
+        if reason is not None:
+            # The worker may be stuck inside the backend: kill it, the next page gets a fresh one
+            self._discard(worker)
+            run_report.record_skip(document, self.stage, page_index, reason, time.monotonic() - start)
+            raise PageSkipped(self.stage, page_index, reason)
+
+        self._release(worker)
+        ok, value = result
+        if not ok:
+            raise RuntimeError(value)
+        return value
+
+    def close(self):
+        """Stop the idle workers."""
+        with self._condition:
+            workers, self._idle = self._idle, []
+            self._started -= len(workers)
+            self._condition.notify_all()
+        for worker in workers:
+            worker.stop()
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(stage: str, workers: int = 1):
+    """
+    Get the process-wide watchdog pool of a stage, growing it to `workers` processes if needed.
+
+    Returns:
+        WatchdogPool: The pool.
+    """
+    with _pools_lock:
+        if stage not in _pools:
+            _pools[stage] = WatchdogPool(stage, workers)
+        pool = _pools[stage]
+    pool.grow(workers)
+    return pool
+
+def run_page(stage: str, function, args, document: str, page_index: int):
+    """Run one page function in the watchdog pool of a stage, see WatchdogPool.run."""
+    return get_pool(stage).run(function, args, document, page_index)
+
+def run_pages(stage: str, function, page_args: dict, document: str, workers: int = 1):
+    """
+    Run a page function on several pages in the watchdog pool of a stage, `workers` pages at a time.
+
+    Args:
+        stage (str): Stage name.
+        function (callable): Page function, module-level.
+        page_args (dict): Arguments of the function for each page index (0-based).
+        document (str): Name of the PDF file, for the run report.
+        workers (int, optional): Number of pages processed at once. Defaults to 1.
+
+    Returns:
+        dict: Result of each page index, or the exception raised for it (PageSkipped or RuntimeError).
+    """
+    pool = get_pool(stage, workers)
+
+    def run(page_index):
+        try:
+            return pool.run(function, page_args[page_index], document, page_index)
+        except Exception as e:
+            return e
+
+    # Threads only wait on the worker processes, which do the work
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(page_args)))) as executor:
+        return dict(zip(page_args, executor.map(run, page_args)))
+
+@atexit.register
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()